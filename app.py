@@ -1,42 +1,178 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, g
 import os
-import datetime
-from web_fetcher import get_page_text, get_wayback_snapshot
-from utils import get_hash, extract_meaningful_content
-from diff_generator import generate_diff_content
+import json
+import functools
+from utils import validate_timestamp
+from diff_generator import stream_diff_content, get_word_diffs, paginate_diff
+from batch import run_batch, BATCH_MAX_ITEMS
+from comparison import prepare_comparison, compare_pages, ComparisonError
+from jobs import job_queue
+from diff_engine import DIFF_ENGINES
+from timeline import build_timeline, TIMELINE_MAX_SNAPSHOTS
+from text_extractor import create_rules
+from diff_rows import dumps_json
+from diff_search import search_diff, list_changes
+from cache import snapshot_cache
+from diff_store import diff_store, diff_results
+from web_fetcher import get_single_flight_stats, get_pool_stats
+import metrics
 
 app = Flask(__name__)
 
-def validate_timestamp(timestamp):
+# Maximum number of rows a single /word-diff call may ask for
+MAX_WORD_DIFF_ROWS = 200
+
+# Largest window of diff rows a paginated response may carry
+MAX_PAGE_SIZE = 5000
+
+def parse_diff_options(data):
     """
-    Validates that the provided timestamp is not later than yesterday.
+    Reads and validates the diff options shared by /generate-diff and /jobs.
+    
+    Returns:
+        tuple: (options, error_message); options is None when the request is invalid
+    """
+    options = {
+        'url': data.get('url'),
+        'timestamp': data.get('timestamp', '20220101'),  # Default to Jan 1, 2022 if not provided
+        'word_diff': bool(data.get('word_diff', False)),
+        'page_size': parse_page_size(data.get('page_size')),
+        'columnar': data.get('format') == 'columnar'
+    }
+    
+    if not options['url']:
+        return None, 'URL is required'
+    
+    if data.get('page_size') is not None and options['page_size'] is None:
+        return None, f'page_size must be between 1 and {MAX_PAGE_SIZE}'
+    
+    if data.get('format') not in (None, 'rows', 'columnar'):
+        return None, "format must be 'rows' or 'columnar'"
+    
+    options['engine'], options['rules'], error_message = parse_engine_and_rules(data)
+    if error_message:
+        return None, error_message
+    
+    # Validate the timestamp to ensure it's not later than yesterday
+    options['timestamp'], options['warning'] = validate_timestamp(options['timestamp'])
+    return options, None
+
+def parse_engine_and_rules(data):
+    """
+    Reads the diff_engine and boilerplate selectors every comparison endpoint accepts.
+    
+    Returns:
+        tuple: (engine, rules, error_message); error_message is None when both are valid
+    """
+    engine = data.get('diff_engine')
+    if engine and engine not in DIFF_ENGINES:
+        return None, None, f"Unknown diff engine. Choose one of: {', '.join(DIFF_ENGINES)}"
+    rules, error_message = parse_rules(data)
+    return engine, rules, error_message
+
+def parse_rules(data):
+    """
+    Builds the boilerplate extraction rules from optional include_selectors/exclude_selectors fields.
     
-    Args:
-        timestamp (str): A timestamp in YYYYMMDD format
-        
     Returns:
-        tuple: (valid_timestamp, warning_message)
+        tuple: (rules, error_message); rules is None when a selector is not supported
     """
     try:
-        # Parse the timestamp
-        timestamp_date = datetime.datetime.strptime(timestamp, "%Y%m%d").date()
-        
-        # Get yesterday's date
-        today = datetime.datetime.now().date()
-        yesterday = today - datetime.timedelta(days=1)
-        
-        # If timestamp is today or later, use yesterday instead
-        if timestamp_date >= today:
-            warning_message = f"Warning: The selected date ({timestamp_date.strftime('%Y-%m-%d')}) is too recent for comparison. Using yesterday's date instead."
-            new_timestamp = yesterday.strftime("%Y%m%d")
-            return new_timestamp, warning_message
-        return timestamp, None
+        return create_rules(data.get('include_selectors'), data.get('exclude_selectors')), None
+    except (TypeError, ValueError) as e:
+        return None, str(e)
+
+def with_diff_result(view):
+    """Looks up the stored diff named by the route's diff_id and passes it to the view, or responds 404."""
+    @functools.wraps(view)
+    def wrapper(diff_id):
+        diff_content = diff_results.get(diff_id)
+        if diff_content is None:
+            return jsonify({'error': 'Diff result has expired, please generate it again'}), 404
+        return view(diff_id, diff_content)
+    return wrapper
+
+def diff_json_response(data, columnar=False):
+    """Returns a JSON response whose diff rows are serialized straight from their compact columns."""
+    with metrics.stage('serialize'):
+        body = dumps_json(data, columnar)
+    return Response(body, mimetype='application/json')
+
+def paginated_response(diff_content, page_size, diff_id=None):
+    """Stores a full diff server-side (unless it is already stored as diff_id) and returns the response data for its first window."""
+    if diff_id is None:
+        diff_id = diff_results.put(diff_content)
+    response_data = {key: value for key, value in diff_content.items() if key != 'diff_data'}
+    response_data.update(paginate_diff(diff_content, 0, page_size))
+    response_data['diff_id'] = diff_id
+    return response_data
+
+def parse_window(args, default_limit):
+    """
+    Reads the cursor and limit query parameters of a windowed endpoint.
+    
+    Returns:
+        tuple: (cursor, limit, error_message); error_message is None when both are valid
+    """
+    try:
+        cursor = int(args.get('cursor', 0))
     except ValueError:
-        # If timestamp format is invalid, use yesterday's date
-        yesterday = datetime.datetime.now().date() - datetime.timedelta(days=1)
-        new_timestamp = yesterday.strftime("%Y%m%d")
-        warning_message = "Invalid date format. Using yesterday's date instead."
-        return new_timestamp, warning_message
+        cursor = -1
+    limit = parse_page_size(args.get('limit'), default=default_limit)
+    if cursor < 0 or limit is None:
+        return None, None, f'cursor must be a row index and limit between 1 and {MAX_PAGE_SIZE}'
+    return cursor, limit, None
+
+def parse_page_size(value, default=None):
+    """Parses a page size parameter, returning None if it is not a valid size."""
+    if value is None:
+        return default
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return None
+    if page_size < 1 or page_size > MAX_PAGE_SIZE:
+        return None
+    return page_size
+
+@app.before_request
+def start_request_metrics():
+    """Starts timing the stages of each request (and samples it for profiling)."""
+    if metrics.METRICS_ENABLED and request.endpoint not in (None, 'static', 'get_metrics'):
+        g.request_metrics = metrics.start_request(request.endpoint)
+
+@app.after_request
+def add_server_timing(response):
+    """Reports the request's stage durations and counters in a Server-Timing header."""
+    request_metrics = g.pop('request_metrics', None)
+    if request_metrics is not None:
+        response.headers['Server-Timing'] = metrics.finish_request(request_metrics)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Export stage and request histograms, counters and cache gauges for Prometheus."""
+    cache_stats = snapshot_cache.get_stats()
+    store_stats = diff_store.get_stats()
+    pool_stats = get_pool_stats()
+    single_flight_stats = get_single_flight_stats()
+    gauges = {
+        'snapshot_cache_hit_ratio': round(cache_stats['hit_ratio'], 4),
+        'snapshot_cache_memory_bytes': cache_stats['memory_bytes'],
+        'snapshot_cache_memory_entries': cache_stats['memory_entries'],
+        'diff_store_entries': store_stats.get('entries', 0),
+        'diff_store_bytes': store_stats.get('bytes', 0),
+        'fetches_in_flight': single_flight_stats['in_flight'],
+        'http_pool_hosts': pool_stats['hosts']
+    }
+    counters = {
+        'http_requests': pool_stats['requests'],
+        'http_handshakes': pool_stats['handshakes'],
+        'http_pool_hits': pool_stats['pool_hits'],
+        'fetches': single_flight_stats['fetches'],
+        'fetches_deduplicated': single_flight_stats['deduplicated']
+    }
+    return Response(metrics.render_metrics(gauges, counters), mimetype='text/plain; version=0.0.4')
 
 @app.route('/')
 def index():
@@ -46,40 +182,207 @@ def index():
 @app.route('/generate-diff', methods=['POST'])
 def generate_diff():
     """Generate a diff between current and archived versions of a URL."""
-    data = request.json
+    data = request.json or {}
+    options, error_message = parse_diff_options(data)
+    # Stream NDJSON records when asked for explicitly or through the Accept header
+    stream = bool(data.get('stream')) or 'application/x-ndjson' in request.headers.get('Accept', '')
+    
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    target_url = options['url']
+    timestamp = options['timestamp']
+    engine = options['engine']
+    word_diff = options['word_diff']
+    warning_message = options['warning']
+    
+    if stream:
+        # Fetch both versions and diff them, streaming rows as they are produced
+        try:
+            clean_current, clean_archived, opcodes = prepare_comparison(target_url, timestamp, engine, rules=options['rules'])
+        except ComparisonError as e:
+            return jsonify({'error': e.message}), e.status_code
+        
+        records = stream_diff_content(clean_current, clean_archived, target_url, timestamp, engine, word_diff, warning_message, opcodes)
+        return Response(
+            stream_with_context(json.dumps(record) + '\n' for record in records),
+            mimetype='application/x-ndjson'
+        )
+    
+    # Fetch both versions and generate the diff content, reusing a stored diff if there is one
+    try:
+        diff_content = compare_pages(target_url, timestamp, engine, word_diff, rules=options['rules'])
+    except ComparisonError as e:
+        return jsonify({'error': e.message}), e.status_code
+    
+    # Add warning message if present
+    if warning_message:
+        diff_content['warning'] = warning_message
+    
+    # With pagination, keep the full result server-side and send only the first window
+    if options['page_size']:
+        return diff_json_response(paginated_response(diff_content, options['page_size']), options['columnar'])
+    
+    return diff_json_response(diff_content, options['columnar'])
+
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    """Queue a comparison in the background and return its job ID right away."""
+    options, error_message = parse_diff_options(request.json or {})
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    job, coalesced = job_queue.submit(options)
+    response_data = job_queue.describe(job)
+    response_data['coalesced'] = coalesced
+    return jsonify(response_data), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Report a job's progress, including its result once it has finished."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown or expired job'}), 404
+    
+    response_data = job_queue.describe(job)
+    if response_data['status'] == 'done':
+        diff_id = job['computation']['diff_id']
+        diff_content = diff_results.get(diff_id)
+        if diff_content is None:
+            return jsonify({'error': 'Job result has expired, please submit it again'}), 404
+        # The result may be shared by coalesced jobs, so this job's options only shape the response
+        options = job['options']
+        if options['warning']:
+            diff_content = dict(diff_content, warning=options['warning'])
+        response_data['result'] = paginated_response(diff_content, options['page_size'], diff_id) if options['page_size'] else diff_content
+    return diff_json_response(response_data, job['options']['columnar'])
+
+@app.route('/generate-diff/batch', methods=['POST'])
+def generate_diff_batch():
+    """Compare many URLs against their archived snapshots in one call."""
+    data = request.json or {}
+    items = data.get('items')
+    similarity_threshold = data.get('similarity_threshold')
+    
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'items must be a non-empty list of {url, timestamp} objects'}), 400
+    
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {BATCH_MAX_ITEMS} items can be compared per request'}), 400
+    
+    if similarity_threshold is not None and (
+        not isinstance(similarity_threshold, (int, float)) or not 0 <= similarity_threshold <= 1
+    ):
+        return jsonify({'error': 'similarity_threshold must be a number between 0 and 1'}), 400
+    
+    engine, rules, error_message = parse_engine_and_rules(data)
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    pairs = []
+    for item in items:
+        if not isinstance(item, dict) or not item.get('url'):
+            return jsonify({'error': 'Every item needs a url'}), 400
+        pairs.append((item['url'], str(item.get('timestamp', '20220101'))))
+    
+    return jsonify(run_batch(pairs, engine, similarity_threshold=similarity_threshold, rules=rules))
+
+@app.route('/timeline', methods=['POST'])
+def generate_timeline():
+    """Compare a URL across several archived snapshots, interval by interval."""
+    data = request.json or {}
     target_url = data.get('url')
-    timestamp = data.get('timestamp', '20220101')  # Default to Jan 1, 2022 if not provided
+    timestamps = data.get('timestamps')
+    include_current = bool(data.get('include_current', False))
     
     if not target_url:
         return jsonify({'error': 'URL is required'}), 400
     
-    # Validate the timestamp to ensure it's not later than yesterday
-    timestamp, warning_message = validate_timestamp(timestamp)
+    if not isinstance(timestamps, list) or not timestamps:
+        return jsonify({'error': 'timestamps must be a non-empty list of YYYYMMDD dates'}), 400
     
-    # Get current content
-    current_text = get_page_text(target_url)
-    if not current_text:
-        return jsonify({'error': 'Failed to fetch current content'}), 400
+    if len(timestamps) + include_current < 2:
+        return jsonify({'error': 'A timeline needs at least two snapshots (or one plus include_current)'}), 400
     
-    # Get archived snapshot URL
-    snapshot_url = get_wayback_snapshot(target_url, timestamp)
-    archived_text = get_page_text(snapshot_url)
+    if len(timestamps) > TIMELINE_MAX_SNAPSHOTS:
+        return jsonify({'error': f'At most {TIMELINE_MAX_SNAPSHOTS} snapshots can be compared per timeline'}), 400
     
-    if not archived_text:
-        return jsonify({'error': 'Failed to fetch archived content'}), 400
+    engine, rules, error_message = parse_engine_and_rules(data)
+    if error_message:
+        return jsonify({'error': error_message}), 400
     
-    # Clean up and normalize text for better comparison
-    clean_current = extract_meaningful_content(current_text)
-    clean_archived = extract_meaningful_content(archived_text)
+    # Timestamps that are too recent or malformed are replaced, like on /generate-diff
+    valid_timestamps = []
+    warnings = []
+    for timestamp in timestamps:
+        timestamp, warning_message = validate_timestamp(str(timestamp))
+        valid_timestamps.append(timestamp)
+        if warning_message:
+            warnings.append(warning_message)
     
-    # Generate diff content
-    diff_content = generate_diff_content(clean_current, clean_archived, target_url, timestamp)
+    try:
+        timeline = build_timeline(target_url, valid_timestamps, engine, include_current, rules)
+    except ComparisonError as e:
+        return jsonify({'error': e.message}), e.status_code
     
-    # Add warning message if present
-    if warning_message:
-        diff_content['warning'] = warning_message
+    if warnings:
+        timeline['warnings'] = warnings
+    return jsonify(timeline)
+
+@app.route('/diff/<diff_id>/rows', methods=['GET'])
+@with_diff_result
+def get_diff_rows(diff_id, diff_content):
+    """Return a window of rows from a previously generated diff."""
+    cursor, limit, error_message = parse_window(request.args, 500)
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    response_data = paginate_diff(diff_content, cursor, limit)
+    response_data['diff_id'] = diff_id
+    return diff_json_response(response_data, request.args.get('format') == 'columnar')
+
+@app.route('/diff/<diff_id>/search', methods=['GET'])
+@with_diff_result
+def search_diff_rows(diff_id, diff_content):
+    """Find the rows of a previously generated diff that contain a query."""
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({'error': 'q is required'}), 400
+    
+    cursor, limit, error_message = parse_window(request.args, 100)
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    changes_only = request.args.get('changes_only') in ('1', 'true')
+    response_data = search_diff(diff_id, diff_content['diff_data'], query, changes_only, cursor, limit)
+    response_data['diff_id'] = diff_id
+    return jsonify(response_data)
+
+@app.route('/diff/<diff_id>/changes', methods=['GET'])
+@with_diff_result
+def get_diff_changes(diff_id, diff_content):
+    """Return a window of only the changed rows of a previously generated diff."""
+    cursor, limit, error_message = parse_window(request.args, 500)
+    if error_message:
+        return jsonify({'error': error_message}), 400
+    
+    response_data = list_changes(diff_id, diff_content['diff_data'], cursor, limit)
+    response_data['diff_id'] = diff_id
+    return jsonify(response_data)
+
+@app.route('/word-diff', methods=['POST'])
+def generate_word_diff():
+    """Generate word-level diffs on demand for a range of changed rows."""
+    data = request.json or {}
+    rows = data.get('rows')
+    
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return jsonify({'error': 'rows must be a list of {old_text, new_text} objects'}), 400
+    
+    if len(rows) > MAX_WORD_DIFF_ROWS:
+        return jsonify({'error': f'At most {MAX_WORD_DIFF_ROWS} rows can be diffed per request'}), 400
     
-    return jsonify(diff_content)
+    return jsonify({'word_diffs': get_word_diffs(rows)})
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5001))
@@ -0,0 +1,120 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from web_fetcher import get_wayback_snapshot
+from utils import validate_timestamp
+from comparison import fetch_clean, ComparisonError
+from diff_generator import generate_diff_content
+import diff_pool
+import metrics
+from similarity import check_similarity, near_identical_result
+
+# Batch settings, overridable through the environment
+BATCH_FETCH_WORKERS = int(os.environ.get('BATCH_FETCH_WORKERS', 8))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', 100))
+
+def diff_stats(current_text, archived_text, url, timestamp, engine=None):
+    """Diffs one page in a worker process and returns only the summary, not the rows."""
+    diff_content = generate_diff_content(current_text, archived_text, url, timestamp, engine)
+    return {
+        'stats': diff_content['stats'],
+        'significant_added': diff_content['significant_added'],
+        'significant_removed': diff_content['significant_removed']
+    }
+
+def fetch_pair(url, timestamp, rules=None):
+    """
+    Fetches and cleans the current and archived text for one batch item.
+
+    Both versions are fetched side by side within FETCH_DEADLINE, exactly as
+    for /generate-diff.
+
+    Returns:
+        tuple: (result, clean_current, clean_archived); the result has 'status' set to
+        'error' and both texts are None if either fetch failed
+    """
+    timestamp, warning_message = validate_timestamp(timestamp)
+    result = {'url': url, 'timestamp': timestamp}
+    if warning_message:
+        result['warning'] = warning_message
+
+    try:
+        clean_current, clean_archived = fetch_clean(url, timestamp, rules=rules)
+    except ComparisonError as e:
+        result.update(status='error', error=e.message)
+        return result, None, None
+
+    # The archived fetch already resolved the snapshot, so this is a cache hit
+    result['snapshot_url'] = get_wayback_snapshot(url, timestamp)
+    return result, clean_current, clean_archived
+
+def run_batch(items, engine=None, fetch_workers=None, similarity_threshold=None, rules=None):
+    """
+    Compares many (url, timestamp) pairs in one call.
+
+    Pages are fetched on a bounded thread pool (web_fetcher applies the
+    per-host rate limits) and diffed on a process pool as soon as both
+    versions arrive. Unchanged pages, and pages at least similarity_threshold
+    similar according to their sketches, are summarized without a diff.
+    A failure only affects its own item.
+
+    Args:
+        items (list): (url, timestamp) tuples
+        engine (str): Optional diff engine name
+        fetch_workers (int): Number of concurrent fetches
+        similarity_threshold (float): Skip the diff for near-identical pages;
+            defaults to NEAR_IDENTICAL_THRESHOLD
+        rules (ExtractionRules): Optional boilerplate rules for text extraction
+
+    Returns:
+        dict: Per-item results in input order and a summary
+    """
+    results = [None] * len(items)
+    diff_futures = {}
+
+    with ThreadPoolExecutor(max_workers=fetch_workers or BATCH_FETCH_WORKERS) as fetch_executor:
+        fetch_futures = {
+            metrics.submit(fetch_executor, fetch_pair, url, timestamp, rules): index
+            for index, (url, timestamp) in enumerate(items)
+        }
+        # Hand each page to the diff pool as soon as both of its versions are in
+        for future in as_completed(fetch_futures):
+            index = fetch_futures[future]
+            url, timestamp = items[index]
+            try:
+                result, clean_current, clean_archived = future.result()
+            except Exception as e:
+                results[index] = {'url': url, 'timestamp': timestamp, 'status': 'error', 'error': str(e)}
+                continue
+            results[index] = result
+            if result.get('status') == 'error':
+                continue
+            verdict, similarity = check_similarity(clean_archived, clean_current, similarity_threshold)
+            if verdict == 'identical':
+                # Identical texts produce a trivial diff, so there is nothing to hand off
+                result.update(diff_stats(clean_current, clean_archived, url, result['timestamp'], engine), status='ok')
+                continue
+            if verdict == 'near_identical':
+                result.update(near_identical_result(similarity), status='ok')
+                continue
+            # Batches wait for queue space rather than failing when the pool is busy
+            args = (clean_current, clean_archived, url, result['timestamp'], engine)
+            diff_futures[index] = (args, diff_pool.submit(diff_stats, *args, block=True))
+
+    for index, (args, future) in diff_futures.items():
+        try:
+            results[index].update(diff_pool.get_result(future, diff_stats, *args))
+            results[index]['status'] = 'ok'
+        except Exception as e:
+            results[index].update(status='error', error=f'Diff failed: {e}')
+
+    succeeded = [result for result in results if result['status'] == 'ok']
+    return {
+        'results': results,
+        'summary': {
+            'total': len(results),
+            'succeeded': len(succeeded),
+            'failed': len(results) - len(succeeded),
+            'changed': sum(1 for result in succeeded if not result['stats']['is_identical']),
+            'near_identical': sum(1 for result in succeeded if result['stats'].get('near_identical'))
+        }
+    }
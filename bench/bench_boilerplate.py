@@ -0,0 +1,45 @@
+"""Compare the old pipeline (full text, no stripping) with the boilerplate stage."""
+import os
+import sys
+import time
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOILERPLATE_REPEATED', '1')
+
+from boilerplate import BOILERPLATE_MIN_PAGES, repeated_lines, clean_pair
+from utils import extract_meaningful_content
+from text_extractor import extract_text, get_backend_name, DEFAULT_RULES, NO_RULES
+from diff_generator import generate_diff_content
+from fixtures import build_site_page
+
+# The menu was relabelled between snapshots, which shows up as noise in every diff
+archived_html = build_site_page(2000, 400, 'Menu')
+current_html = build_site_page(2000, 400, 'Navigation').replace('Paragraph 5 ', 'Paragraph five ')
+# A few other pages of the same site so repeated lines can be learned
+for i in range(BOILERPLATE_MIN_PAGES):
+    repeated_lines.observe(f"https://example.com/other{i}", extract_text(build_site_page(3, 400)).splitlines())
+
+def run_pipeline(rules, strip):
+    current_text = extract_text(current_html, rules=rules)
+    archived_text = extract_text(archived_html, rules=rules)
+    if strip:
+        clean_current, clean_archived = clean_pair('https://example.com/page', current_text, archived_text)
+    else:
+        clean_current, clean_archived = extract_meaningful_content(current_text), extract_meaningful_content(archived_text)
+    return clean_current, generate_diff_content(clean_current, clean_archived, 'https://example.com/page', '20220101')
+
+variants = (('before', NO_RULES, False), ('after', DEFAULT_RULES, True))
+best = {}
+outputs = {}
+# Alternate the variants and keep the best of several rounds, so warm-up and load affect both alike
+for _ in range(5):
+    for label, rules, strip in variants:
+        start = time.perf_counter()
+        outputs[label] = run_pipeline(rules, strip)
+        best[label] = min(best.get(label, float('inf')), time.perf_counter() - start)
+
+for label, rules, strip in variants:
+    clean_current, diff_content = outputs[label]
+    print(f"{label:<7} {best[label] * 1000:8.1f} ms  ({get_backend_name(None, rules)})  {len(clean_current.splitlines())} lines  "
+          f"{diff_content['stats']['total_changes']} changed rows  {diff_content['stats']['total_lines']} rows")
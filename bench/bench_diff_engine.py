@@ -0,0 +1,22 @@
+"""Benchmark each engine against the current difflib path."""
+import os
+import sys
+import time
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_engine import DIFF_ENGINES, get_opcodes
+from fixtures import build_fixture_lines
+
+for count in (1000, 10000, 50000):
+    archived, current = build_fixture_lines(count)
+    print(f"\n{count} lines:")
+    baseline = None
+    for engine in DIFF_ENGINES:
+        start = time.perf_counter()
+        opcodes = get_opcodes(archived, current, engine)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        unchanged = sum(i2 - i1 for tag, i1, i2, j1, j2 in opcodes if tag == 'equal')
+        print(f"  {engine:<9} {elapsed * 1000:9.1f} ms  {baseline / elapsed:5.1f}x  {unchanged} unchanged lines")
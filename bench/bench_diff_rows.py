@@ -0,0 +1,36 @@
+"""Memory and serialization cost of dict rows versus DiffRows on a large page."""
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_engine import get_opcodes
+from diff_generator import create_diff_data, iter_diff_data
+from fixtures import build_fixture_lines
+
+archived, current = build_fixture_lines(50000, edit_ratio=0.3)
+opcodes = get_opcodes(archived, current)
+
+tracemalloc.start()
+dict_rows = list(iter_diff_data(opcodes, archived, current))
+dict_memory = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+
+tracemalloc.start()
+rows = create_diff_data(opcodes, archived, current)
+rows_memory = tracemalloc.get_traced_memory()[0]
+tracemalloc.stop()
+print(f"{len(rows)} rows: dicts {dict_memory / 1024 / 1024:.1f} MiB, DiffRows {rows_memory / 1024 / 1024:.1f} MiB")
+
+for label, serialize in (
+    ('json.dumps(dicts)', lambda: json.dumps(dict_rows)),
+    ('to_json()', rows.to_json),
+    ('to_json(columnar)', lambda: rows.to_json(columnar=True))
+):
+    start = time.perf_counter()
+    size = len(serialize())
+    print(f"  {label:<18} {(time.perf_counter() - start) * 1000:7.1f} ms  {size / 1024:.0f} KiB")
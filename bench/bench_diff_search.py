@@ -0,0 +1,35 @@
+"""Index build and query times on a large diff compared with a linear scan."""
+import os
+import sys
+import time
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_search import DiffIndex
+from diff_engine import get_opcodes
+from diff_generator import create_diff_data
+from fixtures import build_fixture_lines
+
+archived, current = build_fixture_lines(50000, edit_ratio=0.3)
+rows = create_diff_data(get_opcodes(archived, current), archived, current)
+
+start = time.perf_counter()
+index = DiffIndex(rows)
+print(f"{len(rows)} rows: index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+for query in ('Edited line 0.5', 'paragraph 4999', 'Contact'):
+    start = time.perf_counter()
+    indexed = index.search(query)
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    needle = query.lower()
+    scanned = [
+        i for i, (old_text, new_text) in enumerate(zip(rows.old_text, rows.new_text))
+        if needle in old_text.lower() or needle in new_text.lower()
+    ]
+    scan_time = time.perf_counter() - start
+
+    parity = 'match' if indexed == scanned else 'MISMATCH'
+    print(f"  '{query}': {len(indexed)} rows, index {indexed_time * 1000:.1f} ms, scan {scan_time * 1000:.1f} ms  {parity}")
@@ -0,0 +1,32 @@
+"""Cost of computing a large diff versus serving it from the store."""
+import os
+import sys
+import time
+import tempfile
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from diff_store import DiffStore
+from diff_generator import generate_diff_content
+from fixtures import build_fixture_lines
+
+archived, current = build_fixture_lines(50000, edit_ratio=0.3)
+archived_text, current_text = '\n'.join(archived), '\n'.join(current)
+store = DiffStore(os.path.join(tempfile.mkdtemp(), 'diffs.sqlite3'))
+
+start = time.perf_counter()
+diff_content = generate_diff_content(current_text, archived_text, 'https://example.com', '20220101')
+compute_time = time.perf_counter() - start
+
+start = time.perf_counter()
+store.put('bench', diff_content)
+put_time = time.perf_counter() - start
+
+start = time.perf_counter()
+stored = store.get('bench')
+get_time = time.perf_counter() - start
+
+parity = 'match' if list(stored['diff_data']) == list(diff_content['diff_data']) and stored['stats'] == diff_content['stats'] else 'MISMATCH'
+print(f"{len(diff_content['diff_data'])} rows: diff {compute_time * 1000:.1f} ms, store {put_time * 1000:.1f} ms "
+      f"({store.get_stats()['bytes'] / 1024:.0f} KiB), hit {get_time * 1000:.1f} ms  {parity}")
@@ -0,0 +1,36 @@
+"""Compare the cost of the pre-diff check with a full line diff."""
+import os
+import sys
+import time
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from similarity import check_similarity, build_sketch, estimate_similarity
+from diff_engine import get_opcodes
+from fixtures import build_fixture_lines
+
+for count in (1000, 10000, 50000):
+    archived, current = build_fixture_lines(count, edit_ratio=0.01)
+    archived_text, current_text = '\n'.join(archived), '\n'.join(current)
+
+    start = time.perf_counter()
+    get_opcodes(archived, current)
+    diff_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    check_similarity(archived_text, archived_text)
+    identical_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    sketches = build_sketch(archived_text), build_sketch(current_text)
+    sketch_time = time.perf_counter() - start
+
+    # Once stored with the snapshots, comparing sketches is all that is left
+    start = time.perf_counter()
+    similarity = estimate_similarity(*sketches)
+    estimate_time = time.perf_counter() - start
+
+    print(f"{count} lines: diff {diff_time * 1000:.1f} ms, hash check {identical_time * 1000:.2f} ms, "
+          f"building sketches {sketch_time * 1000:.1f} ms, comparing sketches {estimate_time * 1000:.2f} ms "
+          f"(similarity {similarity:.3f})")
@@ -0,0 +1,34 @@
+"""Per-size benchmark of each backend against the original BeautifulSoup path, without and with the default rules."""
+import os
+import sys
+import time
+from bs4 import BeautifulSoup
+
+# The app is a set of top-level modules, so make them importable from here
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from text_extractor import BACKENDS, NO_RULES, extract_text
+from utils import extract_meaningful_content
+from fixtures import build_fixture_page
+
+backends = [name for name, extractor_class in BACKENDS.items() if extractor_class is not None]
+print(f"Available backends: {', '.join(backends)}")
+
+sizes = [10, 100, 1000, 10000]
+for paragraphs in sizes:
+    html = build_fixture_page(paragraphs)
+    start = time.perf_counter()
+    reference = extract_meaningful_content(BeautifulSoup(html, 'html.parser').get_text())
+    reference_time = time.perf_counter() - start
+
+    print(f"\n{len(html) / 1024:.0f} KiB page: bs4 {reference_time * 1000:.1f} ms")
+    for name in backends:
+        start = time.perf_counter()
+        text = extract_meaningful_content(extract_text(html, name, NO_RULES))
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stripped = extract_meaningful_content(extract_text(html, name))
+        stripped_time = time.perf_counter() - start
+        print(f"  {name:<10} {elapsed * 1000:8.1f} ms  {reference_time / elapsed:5.1f}x  "
+              f"with rules {stripped_time * 1000:8.1f} ms, {stripped.count(chr(10)) + 1}/{text.count(chr(10)) + 1} lines")
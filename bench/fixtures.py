@@ -0,0 +1,51 @@
+import random
+
+
+def build_fixture_lines(count, seed=0, edit_ratio=0.05):
+    """Builds an (archived, current) pair of page-like line lists with scattered edits."""
+    rng = random.Random(seed)
+    boilerplate = ['Home', 'About', 'Contact', 'Share', 'Read more']
+    archived = []
+    for i in range(count):
+        # Short repeated lines are what trips up difflib's autojunk heuristic
+        archived.append(boilerplate[i % len(boilerplate)] if i % 4 == 0 else f"Paragraph {i} text {rng.random():.6f}")
+    current = list(archived)
+    for _ in range(int(count * edit_ratio)):
+        position = rng.randrange(len(current))
+        action = rng.random()
+        if action < 0.4:
+            current[position] = f"Edited line {rng.random():.6f}"
+        elif action < 0.7:
+            current.insert(position, f"Inserted line {rng.random():.6f}")
+        else:
+            del current[position]
+    return archived, current
+
+def build_fixture_page(paragraphs):
+    """Builds a representative HTML page with navigation, scripts, entities and tables."""
+    parts = [
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>Fixture &amp; Page</title>',
+        '<style>body { font-family: sans-serif; }</style>',
+        '<script>window.dataLayer = []; if (a < b) { track("x"); }</script></head><body>',
+        '<nav><ul>', ''.join(f'<li><a href="/n{i}">Nav {i}</a></li>\n' for i in range(10)), '</ul></nav>',
+        '<main>'
+    ]
+    for i in range(paragraphs):
+        parts.append(
+            f'<h2>Section {i}</h2>\n<p>Paragraph {i} with <b>bold</b> text, an entity &copy; &#8212; '
+            f'and a <a href="/l{i}">link</a>.<br/>Second line&nbsp;{i}.</p>\n'
+            f'<!-- comment {i} --><table><tr><td>Cell {i}</td><td>{i * 7}</td></tr></table>\n'
+            f'<pre>  preformatted {i}  </pre>\n<script>var s{i} = "<p>not text</p>";</script>\n'
+        )
+    parts.append('</main><footer><p>Footer text</p></footer></body></html>')
+    return ''.join(parts)
+
+def build_site_page(paragraphs, menu_items, menu_label='Menu'):
+    """Builds a fixture page wrapped in a large navigation menu and footer, like most real sites."""
+    menu = ''.join(f'<li><a href="/m{i}">{menu_label} item {i}</a></li>\n' for i in range(menu_items))
+    footer = ''.join(f'<a href="/f{i}">Footer link {i}</a>\n' for i in range(menu_items // 2))
+    page = build_fixture_page(paragraphs)
+    page = page.replace('<main>', f'<header><ul>{menu}</ul></header><main>')
+    page = page.replace('<footer>', f'<footer>{footer}')
+    # Cookie notices are usually plain divs that only repeated-line detection catches
+    return page.replace('</body>', '<div class="notice">We use cookies to improve your experience.</div></body>')
@@ -0,0 +1,121 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+from urllib.parse import urlsplit
+from utils import extract_meaningful_content
+
+# Repeated-line detection settings, overridable through the environment. Off by default:
+# what it strips depends on which other pages this process has seen, so the same pair of
+# versions can diff differently over time and between workers
+BOILERPLATE_REPEATED = os.environ.get('BOILERPLATE_REPEATED', '0') != '0'
+# A line counts as boilerplate once it has been seen on this many different pages of a host
+BOILERPLATE_MIN_PAGES = int(os.environ.get('BOILERPLATE_MIN_PAGES', 3))
+BOILERPLATE_HOST_PAGES = int(os.environ.get('BOILERPLATE_HOST_PAGES', 200))
+BOILERPLATE_HOST_LINES = int(os.environ.get('BOILERPLATE_HOST_LINES', 20000))
+BOILERPLATE_MAX_HOSTS = int(os.environ.get('BOILERPLATE_MAX_HOSTS', 256))
+
+
+class RepeatedLineIndex:
+    """
+    Learns which lines repeat across different pages of the same host.
+
+    Menus, cookie notices and footers that the extraction rules miss show
+    up verbatim on every page of a site. Each distinct page (its URL without
+    the query string) is counted once per line, by a stable digest so no page
+    text is kept, and lines seen on at least min_pages pages are treated as
+    boilerplate. The index lives in memory, so each worker process learns
+    its own.
+    """
+
+    def __init__(self, min_pages=BOILERPLATE_MIN_PAGES, host_pages=BOILERPLATE_HOST_PAGES,
+                 host_lines=BOILERPLATE_HOST_LINES, max_hosts=BOILERPLATE_MAX_HOSTS):
+        self.min_pages = min_pages
+        self.host_pages = host_pages
+        self.host_lines = host_lines
+        self.max_hosts = max_hosts
+        self._lock = threading.Lock()
+        # host -> (URLs already counted, line hash -> number of pages)
+        self._hosts = OrderedDict()
+
+    def observe(self, url, lines):
+        """Counts the lines of one page towards its host's boilerplate."""
+        host, page = self._split(url)
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None:
+                entry = self._hosts[host] = (set(), Counter())
+                while len(self._hosts) > self.max_hosts:
+                    self._hosts.popitem(last=False)
+            self._hosts.move_to_end(host)
+
+            pages, counts = entry
+            # Once enough pages have been seen the counts are stable
+            if page in pages or len(pages) >= self.host_pages:
+                return
+            pages.add(page)
+            counts.update({line_digest(line) for line in lines})
+            if len(counts) > self.host_lines:
+                # Forget lines only ever seen once to keep the index bounded
+                for line_hash in [line_hash for line_hash, count in counts.items() if count == 1]:
+                    del counts[line_hash]
+
+    def find(self, url, archived_lines, current_lines):
+        """Returns the boilerplate lines present in both versions of a page."""
+        host, _ = self._split(url)
+        with self._lock:
+            entry = self._hosts.get(host)
+            if entry is None or len(entry[0]) < self.min_pages:
+                return set()
+            counts = entry[1]
+            # Only lines on both sides are dropped, so no actual change is ever hidden
+            return {
+                line for line in set(archived_lines).intersection(current_lines)
+                if counts.get(line_digest(line), 0) >= self.min_pages
+            }
+
+    @staticmethod
+    def _split(url):
+        # Query-string variants (tracking parameters, sort orders) are the same page
+        parts = urlsplit(url)
+        return parts.hostname, f"{parts.hostname}{parts.path.rstrip('/')}"
+
+
+def line_digest(line):
+    """A compact hash of a line that, unlike hash(), is the same in every process."""
+    return hashlib.blake2b(line.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+
+
+repeated_lines = RepeatedLineIndex()
+
+
+def clean_pair(url, current_text, archived_text):
+    """
+    Normalizes both versions of a page and strips boilerplate lines they share.
+
+    Runs between get_page_text (which already applies the extraction rules)
+    and the diff.
+
+    Args:
+        url (str): The live URL both versions belong to
+        current_text (str): The extracted current text
+        archived_text (str): The extracted archived text
+
+    Returns:
+        tuple: (clean_current, clean_archived)
+    """
+    clean_current = extract_meaningful_content(current_text)
+    clean_archived = extract_meaningful_content(archived_text)
+    if not BOILERPLATE_REPEATED:
+        return clean_current, clean_archived
+
+    current_lines = clean_current.splitlines()
+    archived_lines = clean_archived.splitlines()
+    repeated_lines.observe(url, current_lines)
+    boilerplate = repeated_lines.find(url, archived_lines, current_lines)
+    if not boilerplate:
+        return clean_current, clean_archived
+
+    clean_current = '\n'.join(line for line in current_lines if line not in boilerplate)
+    clean_archived = '\n'.join(line for line in archived_lines if line not in boilerplate)
+    return clean_current, clean_archived
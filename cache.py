@@ -0,0 +1,309 @@
+import os
+import time
+import sqlite3
+import tempfile
+import threading
+import uuid
+from collections import OrderedDict
+from utils import get_hash
+
+# Cache settings, overridable through the environment
+CACHE_DIR = os.environ.get('CACHE_DIR', os.path.join(tempfile.gettempdir(), 'web-content-diff-cache'))
+CACHE_DISK_ENABLED = os.environ.get('CACHE_DISK_ENABLED', '1') != '0'
+MEMORY_MAX_BYTES = int(os.environ.get('CACHE_MEMORY_MAX_BYTES', 64 * 1024 * 1024))
+DISK_MAX_BYTES = int(os.environ.get('CACHE_DISK_MAX_BYTES', 512 * 1024 * 1024))
+LIVE_TTL = float(os.environ.get('CACHE_LIVE_TTL', 300))
+RESULT_MAX_ENTRIES = int(os.environ.get('CACHE_RESULT_MAX_ENTRIES', 64))
+RESULT_TTL = float(os.environ.get('CACHE_RESULT_TTL', 1800))
+INTERVAL_MAX_ENTRIES = int(os.environ.get('CACHE_INTERVAL_MAX_ENTRIES', 1024))
+INTERVAL_TTL = float(os.environ.get('CACHE_INTERVAL_TTL', 86400))
+
+
+class TextCache:
+    """
+    Two-tier cache of extracted page text.
+
+    Entries are keyed by URL (plus Wayback timestamp) and point at bodies
+    stored once per SHA-256 content hash, so identical pages share storage.
+    The memory tier is an LRU bounded by body size; the disk tier is a
+    SQLite file with the same bound applied by last access time.
+    """
+
+    def __init__(self, path=None, memory_max_bytes=MEMORY_MAX_BYTES, disk_max_bytes=DISK_MAX_BYTES):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.path = path
+        self._lock = threading.Lock()
+        # key -> (content_hash, expires_at, validators); expires_at is None for archived pages
+        self._entries = OrderedDict()
+        # content_hash -> [text, refcount]
+        self._bodies = {}
+        self._memory_bytes = 0
+        self._db = None
+        self.stats = {
+            'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stale_hits': 0,
+            'evictions': 0, 'stores': 0, 'revalidated': 0
+        }
+
+    def get(self, key):
+        """Returns the cached text for key, or None if missing or expired."""
+        entry = self.lookup(key)
+        if entry is None or not entry[2]:
+            return None
+        return entry[0]
+
+    def lookup(self, key):
+        """
+        Looks up key in both tiers, including expired entries.
+
+        Returns:
+            tuple: (text, validators, is_fresh), or None if the key is unknown
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                content_hash, expires_at, validators = entry
+                self._entries.move_to_end(key)
+                text = self._bodies[content_hash][0]
+                tier = 'memory_hits'
+            else:
+                row = self._disk_get(key, now)
+                if row is None:
+                    self.stats['misses'] += 1
+                    return None
+                content_hash, expires_at, etag, last_modified, text = row
+                validators = {'etag': etag, 'last_modified': last_modified}
+                self._memory_put(key, content_hash, expires_at, validators, text)
+                tier = 'disk_hits'
+
+            is_fresh = expires_at is None or expires_at > now
+            # Stale entries are only useful for conditional revalidation
+            self.stats[tier if is_fresh else 'stale_hits'] += 1
+            return text, validators, is_fresh
+
+    def put(self, key, text, ttl=None, validators=None):
+        """Stores text under key; ttl of None keeps the entry until evicted."""
+        content_hash = get_hash(text)
+        expires_at = time.time() + ttl if ttl is not None else None
+        validators = validators or {'etag': None, 'last_modified': None}
+        with self._lock:
+            self._memory_put(key, content_hash, expires_at, validators, text)
+            self._disk_put(key, content_hash, expires_at, validators, text)
+            self.stats['stores'] += 1
+        return content_hash
+
+    def refresh(self, key, ttl):
+        """Extends the lifetime of an existing entry after a successful revalidation."""
+        expires_at = time.time() + ttl if ttl is not None else None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], expires_at, entry[2])
+            self._disk_refresh(key, expires_at)
+            self.stats['revalidated'] += 1
+
+    def get_stats(self):
+        """Returns hit/miss counters and current memory usage."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self._entries)
+            stats['memory_bytes'] = self._memory_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0.0
+        return stats
+
+    # Memory tier
+
+    def _memory_put(self, key, content_hash, expires_at, validators, text):
+        if key in self._entries:
+            self._drop_memory_entry(key)
+        body = self._bodies.get(content_hash)
+        if body is None:
+            self._bodies[content_hash] = [text, 1]
+            self._memory_bytes += len(text)
+        else:
+            body[1] += 1
+        self._entries[key] = (content_hash, expires_at, validators)
+
+        # Evict least recently used entries until we are back under the bound
+        while self._memory_bytes > self.memory_max_bytes and len(self._entries) > 1:
+            oldest_key = next(iter(self._entries))
+            self._drop_memory_entry(oldest_key)
+            self.stats['evictions'] += 1
+
+    def _drop_memory_entry(self, key):
+        content_hash = self._entries.pop(key)[0]
+        body = self._bodies[content_hash]
+        body[1] -= 1
+        if body[1] == 0:
+            self._memory_bytes -= len(body[0])
+            del self._bodies[content_hash]
+
+    # Disk tier
+
+    def _connect(self):
+        if self.path is None:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    expires_at REAL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    last_access REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS bodies (
+                    content_hash TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+            ''')
+        return self._db
+
+    def _disk_get(self, key, now):
+        try:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute(
+                'SELECT e.content_hash, e.expires_at, e.etag, e.last_modified, b.text FROM entries e '
+                'JOIN bodies b ON b.content_hash = e.content_hash WHERE e.key = ?',
+                (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            db.execute('UPDATE entries SET last_access = ? WHERE key = ?', (now, key))
+            db.commit()
+            return row
+        except sqlite3.Error as e:
+            print(f"Cache read failed for {key}: {e}")
+            return None
+
+    def _disk_put(self, key, content_hash, expires_at, validators, text):
+        try:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                'INSERT OR IGNORE INTO bodies (content_hash, text, size) VALUES (?, ?, ?)',
+                (content_hash, text, len(text))
+            )
+            db.execute(
+                'INSERT OR REPLACE INTO entries (key, content_hash, expires_at, etag, last_modified, last_access) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (key, content_hash, expires_at, validators.get('etag'), validators.get('last_modified'), time.time())
+            )
+            self._disk_evict(db)
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Cache write failed for {key}: {e}")
+
+    def _disk_refresh(self, key, expires_at):
+        try:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                'UPDATE entries SET expires_at = ?, last_access = ? WHERE key = ?',
+                (expires_at, time.time(), key)
+            )
+            db.commit()
+        except sqlite3.Error as e:
+            print(f"Cache write failed for {key}: {e}")
+
+    def _disk_evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+        if total <= self.disk_max_bytes:
+            return
+        # Drop expired entries first, then the least recently used ones
+        db.execute('DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),))
+        self._disk_drop_orphans(db)
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+        while total > self.disk_max_bytes:
+            oldest = db.execute('SELECT key FROM entries ORDER BY last_access LIMIT 1').fetchone()
+            if oldest is None:
+                break
+            db.execute('DELETE FROM entries WHERE key = ?', oldest)
+            self._disk_drop_orphans(db)
+            self.stats['evictions'] += 1
+            total = db.execute('SELECT COALESCE(SUM(size), 0) FROM bodies').fetchone()[0]
+
+    def _disk_drop_orphans(self, db):
+        db.execute('DELETE FROM bodies WHERE content_hash NOT IN (SELECT content_hash FROM entries)')
+
+
+def cache_key(url, timestamp=None, profile=None):
+    """
+    Builds the cache key for a live URL or a Wayback (url, timestamp) pair.
+
+    The extraction profile (a fingerprint of the boilerplate rules) is part
+    of the key, since the same page yields different text under other rules.
+    """
+    key = f"{timestamp}|{url}" if timestamp else f"live|{url}"
+    return f"{profile}|{key}" if profile else key
+
+
+snapshot_cache = TextCache(os.path.join(CACHE_DIR, 'snapshots.sqlite3') if CACHE_DISK_ENABLED else None)
+
+
+class ResultCache:
+    """
+    In-memory LRU of finished diff results, keyed by an opaque ID.
+
+    Lets follow-up requests (further pages, searches) reuse a diff without
+    recomputing it. Entries expire after ttl seconds. With a backend (an
+    object with put_result and get_result, such as the diff store), results
+    are written through to it and memory misses are read back from it, so
+    any worker process can serve a result another one produced.
+    """
+
+    def __init__(self, max_entries=RESULT_MAX_ENTRIES, ttl=RESULT_TTL, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self._lock = threading.Lock()
+        # result_id -> (expires_at, result)
+        self._entries = OrderedDict()
+
+    def put(self, result, result_id=None):
+        """Stores a result and returns its ID."""
+        result_id = result_id or uuid.uuid4().hex
+        expires_at = time.time() + self.ttl
+        self._memory_put(result_id, expires_at, result)
+        if self.backend is not None:
+            self.backend.put_result(result_id, result, expires_at)
+        return result_id
+
+    def get(self, result_id):
+        """Returns the stored result, or None if it is unknown or expired."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None:
+                if entry[0] > time.time():
+                    self._entries.move_to_end(result_id)
+                    return entry[1]
+                del self._entries[result_id]
+
+        # Another worker may have produced it
+        entry = self.backend.get_result(result_id) if self.backend is not None else None
+        if entry is None:
+            return None
+        self._memory_put(result_id, *entry)
+        return entry[1]
+
+    def _memory_put(self, result_id, expires_at, result):
+        with self._lock:
+            self._entries[result_id] = (expires_at, result)
+            self._entries.move_to_end(result_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Timeline interval stats, keyed by engine and the content hashes of both ends
+interval_results = ResultCache(INTERVAL_MAX_ENTRIES, INTERVAL_TTL)
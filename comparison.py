@@ -0,0 +1,181 @@
+import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from web_fetcher import get_page_text, get_wayback_snapshot
+from boilerplate import clean_pair
+from diff_pool import compute_opcodes, DiffPoolBusy
+from similarity import check_similarity, identical_opcodes
+from diff_store import diff_store, diff_key
+from diff_generator import generate_diff_content, get_diff_dates
+from utils import get_hash
+import metrics
+
+# Overall time budget (in seconds) for fetching both versions of a page
+FETCH_DEADLINE = float(os.environ.get('FETCH_DEADLINE', 15))
+
+# Shared pool so the live page and the snapshot are fetched side by side
+fetch_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('FETCH_WORKERS', 8)))
+
+
+class ComparisonError(Exception):
+    """A comparison that cannot be completed, with the HTTP status to report it with."""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+@contextmanager
+def diff_pool_capacity():
+    """Reports a full diff pool queue as a 503 ComparisonError."""
+    try:
+        yield
+    except DiffPoolBusy:
+        raise ComparisonError('The server is busy comparing other pages, please try again shortly', 503)
+
+def fetch_snapshot_text(target_url, timestamp, rules=None):
+    """Resolves the Wayback snapshot closest to timestamp and returns its extracted text."""
+    return get_page_text(get_wayback_snapshot(target_url, timestamp), rules)
+
+def fetch_both(target_url, timestamp, deadline=FETCH_DEADLINE, rules=None):
+    """
+    Fetches the current page and the archived snapshot concurrently.
+    
+    The snapshot lookup runs in the archived side's thread, so it overlaps
+    the live fetch and counts against the same deadline.
+    
+    Args:
+        target_url (str): The live URL
+        timestamp (str): A validated YYYYMMDD timestamp
+        deadline (float): Seconds to wait for both fetches (and the snapshot lookup) in total
+        rules (ExtractionRules): Optional boilerplate rules for text extraction
+        
+    Returns:
+        tuple: (current_text, archived_text), with None for any fetch that failed or timed out
+    """
+    current_future = metrics.submit(fetch_executor, get_page_text, target_url, rules)
+    archived_future = metrics.submit(fetch_executor, fetch_snapshot_text, target_url, timestamp, rules)
+    wait([current_future, archived_future], timeout=deadline)
+    
+    results = []
+    for side, future in (('current', current_future), ('archived', archived_future)):
+        if future.done() and not future.exception():
+            results.append(future.result())
+            continue
+        if future.done():
+            print(f"Error fetching {side} content for {target_url}: {future.exception()}")
+        else:
+            # Give up on the straggler; the worker thread finishes on its own
+            future.cancel()
+        results.append(None)
+    return tuple(results)
+
+
+def prepare_comparison(target_url, timestamp, engine=None, progress=None, rules=None):
+    """
+    Fetches both versions of a page, cleans them and computes the line diff.
+    
+    Args:
+        target_url (str): The live URL
+        timestamp (str): A validated YYYYMMDD timestamp
+        engine (str): Optional diff engine name
+        progress (callable): Optional callback receiving the current stage name
+        rules (ExtractionRules): Optional boilerplate rules; defaults to BOILERPLATE_* settings
+        
+    Returns:
+        tuple: (clean_current, clean_archived, opcodes)
+        
+    Raises:
+        ComparisonError: If a fetch fails or the diff pool is too busy
+    """
+    clean_current, clean_archived = fetch_clean(target_url, timestamp, progress, rules)
+    if progress:
+        progress('diffing')
+    return clean_current, clean_archived, diff_opcodes(clean_current, clean_archived, engine)
+
+def compare_pages(target_url, timestamp, engine=None, word_diff=False, progress=None, rules=None):
+    """
+    Fetches both versions of a page and returns the full diff result.
+    
+    Diffs of texts seen before are served from the persistent diff store,
+    keyed by the content hashes of both cleaned texts and the options, so
+    they cost no diff CPU whichever URL or timestamp they came from.
+    
+    Args:
+        target_url (str): The live URL
+        timestamp (str): A validated YYYYMMDD timestamp
+        engine (str): Optional diff engine name
+        word_diff (bool): Include word-level diffs for changed rows
+        progress (callable): Optional callback receiving the current stage name
+        rules (ExtractionRules): Optional boilerplate rules; defaults to BOILERPLATE_* settings
+        
+    Returns:
+        dict: A result in the format of generate_diff_content
+        
+    Raises:
+        ComparisonError: If a fetch fails or the diff pool is too busy
+    """
+    clean_current, clean_archived = fetch_clean(target_url, timestamp, progress, rules)
+    key = diff_key(get_hash(clean_archived), get_hash(clean_current), engine, word_diff)
+    with metrics.stage('diff_store'):
+        stored = diff_store.get(key)
+    metrics.count('diff_store_hits' if stored is not None else 'diff_store_misses')
+    if stored is not None:
+        formatted_archive_date, current_date, date_note = get_diff_dates(timestamp)
+        stored.update(url=target_url, archived_date=formatted_archive_date, current_date=current_date, date_note=date_note)
+        return stored
+    
+    if progress:
+        progress('diffing')
+    opcodes = diff_opcodes(clean_current, clean_archived, engine)
+    if progress:
+        progress('rendering')
+    diff_content = generate_diff_content(clean_current, clean_archived, target_url, timestamp, engine, word_diff, opcodes=opcodes)
+    with metrics.stage('diff_store'):
+        diff_store.put(key, diff_content)
+    return diff_content
+
+def fetch_clean(target_url, timestamp, progress=None, rules=None):
+    """
+    Fetches both versions of a page and normalizes them for diffing.
+    
+    Returns:
+        tuple: (clean_current, clean_archived)
+        
+    Raises:
+        ComparisonError: If a fetch fails
+    """
+    # Fetch current and archived content at the same time
+    if progress:
+        progress('fetching')
+    current_text, archived_text = fetch_both(target_url, timestamp, rules=rules)
+    if not current_text:
+        raise ComparisonError('Failed to fetch current content')
+    
+    if not archived_text:
+        raise ComparisonError('Failed to fetch archived content')
+    
+    # Clean up and normalize text, dropping boilerplate both versions share
+    with metrics.stage('clean'):
+        clean_current, clean_archived = clean_pair(target_url, current_text, archived_text)
+    metrics.count('current_lines', clean_current.count('\n') + 1)
+    metrics.count('archived_lines', clean_archived.count('\n') + 1)
+    return clean_current, clean_archived
+
+def diff_opcodes(clean_current, clean_archived, engine=None):
+    """
+    Computes the line diff opcodes of two cleaned texts.
+    
+    Raises:
+        ComparisonError: If the diff pool is too busy
+    """
+    # Unchanged pages skip the diff pool entirely
+    verdict, _ = check_similarity(clean_archived, clean_current, threshold=1.0)
+    if verdict == 'identical':
+        metrics.count('identical_pages')
+        return identical_opcodes(len(clean_current.splitlines()))
+    
+    # Run the line diff on the process pool so the caller's thread stays responsive
+    with diff_pool_capacity(), metrics.stage('diff'):
+        return compute_opcodes(clean_archived.splitlines(), clean_current.splitlines(), engine)
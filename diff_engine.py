@@ -0,0 +1,259 @@
+import os
+import bisect
+import difflib
+
+# Default line diff engine: 'difflib', 'myers' or 'patience'
+DIFF_ENGINE = os.environ.get('DIFF_ENGINE', 'patience')
+
+DIFF_ENGINES = ('difflib', 'myers', 'patience')
+
+
+def get_opcodes(a, b, engine=None):
+    """
+    Diffs two sequences and returns SequenceMatcher-style opcodes.
+
+    Args:
+        a (list): The old sequence (archived lines)
+        b (list): The new sequence (current lines)
+        engine (str): 'difflib', 'myers' or 'patience'; defaults to DIFF_ENGINE
+
+    Returns:
+        list: (tag, i1, i2, j1, j2) tuples covering both sequences, as produced by
+        difflib.SequenceMatcher.get_opcodes()
+    """
+    engine = engine or DIFF_ENGINE
+    # Diff compact integer IDs instead of the line strings themselves
+    a, b = intern_lines(a, b)
+    if engine == 'difflib':
+        return difflib.SequenceMatcher(None, a, b).get_opcodes()
+    if engine == 'myers':
+        blocks = myers_matching_blocks(a, b)
+    elif engine == 'patience':
+        blocks = patience_matching_blocks(a, b)
+    else:
+        raise ValueError(f"Unknown diff engine: {engine}")
+    return opcodes_from_blocks(blocks, len(a), len(b))
+
+
+def intern_lines(a, b):
+    """
+    Maps every distinct line in both sequences to a small integer ID.
+
+    Lines arrive already normalized by extract_meaningful_content, so equal
+    text means equal ID. The engines then compare and hash integers instead
+    of strings. Plain lists are used rather than array('i'): each ID object
+    is shared through the dict, so a list costs one pointer per line, and
+    indexing an array would box a new int on every comparison in the hot
+    loops.
+    """
+    ids = {}
+    a_ids = [ids.setdefault(line, len(ids)) for line in a]
+    b_ids = [ids.setdefault(line, len(ids)) for line in b]
+    return a_ids, b_ids
+
+
+def opcodes_from_blocks(blocks, len_a, len_b):
+    """Turns sorted (i, j, size) matching blocks into SequenceMatcher-style opcodes."""
+    opcodes = []
+    i = j = 0
+    for ai, bj, size in blocks + [(len_a, len_b, 0)]:
+        if i < ai and j < bj:
+            opcodes.append(('replace', i, ai, j, bj))
+        elif i < ai:
+            opcodes.append(('delete', i, ai, j, bj))
+        elif j < bj:
+            opcodes.append(('insert', i, ai, j, bj))
+        if size:
+            opcodes.append(('equal', ai, ai + size, bj, bj + size))
+        i, j = ai + size, bj + size
+    return opcodes
+
+
+def merge_blocks(blocks):
+    """Sorts matching blocks and joins runs that touch each other."""
+    merged = []
+    for i, j, size in sorted(blocks):
+        if merged and merged[-1][0] + merged[-1][2] == i and merged[-1][1] + merged[-1][2] == j:
+            merged[-1] = (merged[-1][0], merged[-1][1], merged[-1][2] + size)
+        elif size:
+            merged.append((i, j, size))
+    return merged
+
+
+def trim_common(a, b, alo, ahi, blo, bhi, blocks):
+    """Strips the common prefix and suffix of a[alo:ahi] and b[blo:bhi], recording them as matches."""
+    start_a, start_b = alo, blo
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    if alo > start_a:
+        blocks.append((start_a, start_b, alo - start_a))
+
+    end_a = ahi
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if ahi < end_a:
+        blocks.append((ahi, bhi, end_a - ahi))
+    return alo, ahi, blo, bhi
+
+
+def myers_matching_blocks(a, b):
+    """Finds matching blocks with Myers' O(ND) algorithm in linear space."""
+    blocks = []
+    # Explicit stack of sub-ranges so large inputs cannot hit the recursion limit
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = trim_common(a, b, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+        split = middle_snake(a, alo, ahi, b, blo, bhi)
+        if split is None:
+            continue
+        x, y = split
+        stack.append((x, ahi, y, bhi))
+        stack.append((alo, x, blo, y))
+    return merge_blocks(blocks)
+
+
+def middle_snake(a, alo, ahi, b, blo, bhi):
+    """
+    Finds the split point of the middle snake for a[alo:ahi] against b[blo:bhi].
+
+    Runs the forward and reverse searches of Myers' divide-and-conquer step
+    until they overlap, using only O(N + M) memory.
+
+    Returns:
+        tuple: (x, y) absolute split indexes, or None if the ranges share nothing
+    """
+    n = ahi - alo
+    m = bhi - blo
+    max_d = (n + m + 1) // 2
+    offset = max_d
+    size = 2 * max_d + 2
+    forward = [-1] * size
+    reverse = [-1] * size
+    forward[offset + 1] = 0
+    reverse[offset + 1] = 0
+    delta = n - m
+    # With an odd delta the paths can only meet on a forward step
+    front = delta % 2 != 0
+    k1start = k1end = k2start = k2end = 0
+
+    for d in range(max_d):
+        for k1 in range(-d + k1start, d + 1 - k1end, 2):
+            k1_offset = offset + k1
+            if k1 == -d or (k1 != d and forward[k1_offset - 1] < forward[k1_offset + 1]):
+                x1 = forward[k1_offset + 1]
+            else:
+                x1 = forward[k1_offset - 1] + 1
+            y1 = x1 - k1
+            while x1 < n and y1 < m and a[alo + x1] == b[blo + y1]:
+                x1 += 1
+                y1 += 1
+            forward[k1_offset] = x1
+            if x1 > n:
+                k1end += 2
+            elif y1 > m:
+                k1start += 2
+            elif front:
+                k2_offset = offset + delta - k1
+                if 0 <= k2_offset < size and reverse[k2_offset] != -1:
+                    if x1 >= n - reverse[k2_offset]:
+                        return alo + x1, blo + y1
+
+        for k2 in range(-d + k2start, d + 1 - k2end, 2):
+            k2_offset = offset + k2
+            if k2 == -d or (k2 != d and reverse[k2_offset - 1] < reverse[k2_offset + 1]):
+                x2 = reverse[k2_offset + 1]
+            else:
+                x2 = reverse[k2_offset - 1] + 1
+            y2 = x2 - k2
+            while x2 < n and y2 < m and a[ahi - x2 - 1] == b[bhi - y2 - 1]:
+                x2 += 1
+                y2 += 1
+            reverse[k2_offset] = x2
+            if x2 > n:
+                k2end += 2
+            elif y2 > m:
+                k2start += 2
+            elif not front:
+                k1_offset = offset + delta - k2
+                if 0 <= k1_offset < size and forward[k1_offset] != -1:
+                    x1 = forward[k1_offset]
+                    y1 = offset + x1 - k1_offset
+                    if x1 >= n - x2:
+                        return alo + x1, blo + y1
+    return None
+
+
+def patience_matching_blocks(a, b):
+    """
+    Finds matching blocks with patience diff.
+
+    Lines that occur exactly once on both sides are used as anchors, which
+    keeps moved paragraphs and repeated boilerplate (nav items, footers)
+    from being aligned against the wrong copy. Ranges without unique lines
+    fall back to Myers.
+    """
+    blocks = []
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = trim_common(a, b, *stack.pop(), blocks)
+        if alo == ahi or blo == bhi:
+            continue
+
+        anchors = unique_common_anchors(a, alo, ahi, b, blo, bhi)
+        if not anchors:
+            for i, j, size in myers_matching_blocks(a[alo:ahi], b[blo:bhi]):
+                blocks.append((alo + i, blo + j, size))
+            continue
+
+        # Diff the gaps between consecutive anchors independently
+        prev_i, prev_j = alo, blo
+        for i, j in anchors:
+            stack.append((prev_i, i, prev_j, j))
+            blocks.append((i, j, 1))
+            prev_i, prev_j = i + 1, j + 1
+        stack.append((prev_i, ahi, prev_j, bhi))
+    return merge_blocks(blocks)
+
+
+def unique_common_anchors(a, alo, ahi, b, blo, bhi):
+    """Returns the longest increasing run of lines unique to both ranges, as (i, j) pairs."""
+    counts = {}
+    for i in range(alo, ahi):
+        entry = counts.get(a[i])
+        counts[a[i]] = [i, None, 1 if entry is None else entry[2] + 1, 0]
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] = j
+            entry[3] += 1
+
+    pairs = [(entry[0], entry[1]) for entry in counts.values() if entry[2] == 1 and entry[3] == 1]
+    if not pairs:
+        return []
+    pairs.sort()
+
+    # Patience sorting: longest increasing subsequence of the b positions
+    pile_tops = []
+    pile_items = []
+    back = [None] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        pile = bisect.bisect_left(pile_tops, j)
+        if pile == len(pile_tops):
+            pile_tops.append(j)
+            pile_items.append(index)
+        else:
+            pile_tops[pile] = j
+            pile_items[pile] = index
+        back[index] = pile_items[pile - 1] if pile else None
+
+    anchors = []
+    index = pile_items[-1]
+    while index is not None:
+        anchors.append(pairs[index])
+        index = back[index]
+    anchors.reverse()
+    return anchors
@@ -1,48 +1,52 @@
 import difflib
 import re
 from utils import extract_significant_changes, get_formatted_dates
+from diff_engine import get_opcodes
+from similarity import identical_opcodes
+from diff_rows import DiffRows
+from metrics import stage
 import datetime
 
-def generate_diff_content(current_text, archived_text, url, timestamp):
-    """Generates diff data between current and archived content."""
+def generate_diff_content(current_text, archived_text, url, timestamp, engine=None, word_diff=False, opcodes=None):
+    """
+    Generates diff data between current and archived content.
+    
+    Word-level diffs for changed lines are left out unless word_diff is True;
+    the UI requests them on demand for the rows it actually displays.
+    Precomputed line opcodes (e.g. from the diff pool) can be passed in.
+    """
     # Split the text into lines for comparison
     current_lines = current_text.splitlines()
     archived_lines = archived_text.splitlines()
     
     # Get formatted dates
-    formatted_archive_date, current_date = get_formatted_dates(timestamp)
-    
-    # Check if the archive date is today or in the future
-    archive_date = datetime.datetime.strptime(formatted_archive_date, "%m-%d-%Y").date()
-    today = datetime.datetime.now().date()
-    
-    # Add a note if the date was adjusted
-    date_note = None
-    if archive_date >= today:
-        yesterday = today - datetime.timedelta(days=1)
-        date_note = "Note: Archive dates cannot be today or in the future. The comparison is using yesterday's date instead."
+    formatted_archive_date, current_date, date_note = get_diff_dates(timestamp)
     
     # Check if the content is identical
     is_identical = current_text == archived_text
     
+    # Generate the line diff with the selected engine; identical texts need no diff
+    if opcodes is None:
+        with stage('diff'):
+            opcodes = identical_opcodes(len(current_lines)) if is_identical else get_opcodes(archived_lines, current_lines, engine)
+    
     # Extract significant changes for the summary
     significant_added = []
     significant_removed = []
     
-    # Only extract significant changes if the content is different
+    # Only extract significant changes if the content is different, reusing the line diff
     if not is_identical:
-        significant_added, significant_removed = extract_significant_changes(archived_lines, current_lines)
-    
-    # Generate the diff using difflib's SequenceMatcher
-    matcher = difflib.SequenceMatcher(None, archived_lines, current_lines)
+        with stage('significant'):
+            significant_added, significant_removed = extract_significant_changes(opcodes, archived_lines, current_lines)
     
-    # Create diff data
-    diff_data = create_diff_data(matcher, archived_lines, current_lines)
+    # Create diff data; rows are counted by type while they are built (word diffs included)
+    with stage('rows'):
+        diff_data = create_diff_data(opcodes, archived_lines, current_lines, word_diff)
     
     # Count the actual changes (non-equal lines)
-    added_lines = sum(1 for item in diff_data if item['type'] == 'add')
-    removed_lines = sum(1 for item in diff_data if item['type'] == 'remove')
-    changed_lines = sum(1 for item in diff_data if item['type'] == 'change')
+    added_lines = diff_data.counts['add']
+    removed_lines = diff_data.counts['remove']
+    changed_lines = diff_data.counts['change']
     
     # Create the response data
     response_data = {
@@ -65,60 +69,147 @@ def generate_diff_content(current_text, archived_text, url, timestamp):
     
     return response_data
 
-def create_diff_data(matcher, archived_lines, current_lines):
-    """Create structured diff data from the sequence matcher."""
-    diff_data = []
-    line_num = 0
+def stream_diff_content(current_text, archived_text, url, timestamp, engine=None, word_diff=False, warning=None, opcodes=None):
+    """
+    Generates the same diff as generate_diff_content as a stream of records.
+    
+    Yields a 'header' record with the URL and dates, one 'row' record per
+    diff row as it is produced, and a 'trailer' record with the stats and
+    significant changes, so no full diff_data list is ever built.
+    """
+    current_lines = current_text.splitlines()
+    archived_lines = archived_text.splitlines()
+    formatted_archive_date, current_date, date_note = get_diff_dates(timestamp)
+    is_identical = current_text == archived_text
     
-    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-        if tag == 'equal':
-            # For equal blocks, just add a few context lines
-            context_lines = min(3, i2 - i1)  # Show at most 3 context lines
-            if context_lines > 0:
-                for i in range(i2 - context_lines, i2):
-                    line_num += 1
-                    diff_data.append({
-                        'type': 'equal',
-                        'line_num': line_num,
-                        'old_text': archived_lines[i],
-                        'new_text': current_lines[j1 + (i - (i2 - context_lines))]
-                    })
-        elif tag == 'replace':
-            # Lines were changed
-            for i, j in zip(range(i1, i2), range(j1, j2)):
-                line_num += 1
-                old_line = archived_lines[i] if i < len(archived_lines) else ""
-                new_line = current_lines[j] if j < len(current_lines) else ""
-                word_diff = get_word_diff(old_line, new_line)
-                diff_data.append({
-                    'type': 'change',
-                    'line_num': line_num,
-                    'old_text': old_line,
-                    'new_text': new_line,
-                    'word_diff': word_diff
-                })
-        elif tag == 'delete':
-            # Lines were removed
-            for i in range(i1, i2):
-                line_num += 1
-                diff_data.append({
-                    'type': 'remove',
-                    'line_num': line_num,
-                    'old_text': archived_lines[i],
-                    'new_text': ''
-                })
-        elif tag == 'insert':
-            # Lines were added
-            for j in range(j1, j2):
-                line_num += 1
-                diff_data.append({
-                    'type': 'add',
-                    'line_num': line_num,
-                    'old_text': '',
-                    'new_text': current_lines[j]
-                })
-    
-    return diff_data
+    header = {
+        'record': 'header',
+        'url': url,
+        'archived_date': formatted_archive_date,
+        'current_date': current_date,
+        'date_note': date_note
+    }
+    if warning:
+        header['warning'] = warning
+    yield header
+    
+    if opcodes is None:
+        opcodes = identical_opcodes(len(current_lines)) if is_identical else get_opcodes(archived_lines, current_lines, engine)
+    
+    # Count rows by type as they go out
+    counts = {'equal': 0, 'add': 0, 'remove': 0, 'change': 0}
+    for row in iter_diff_data(opcodes, archived_lines, current_lines, word_diff):
+        counts[row['type']] += 1
+        row['record'] = 'row'
+        yield row
+    
+    significant_added = []
+    significant_removed = []
+    if not is_identical:
+        significant_added, significant_removed = extract_significant_changes(opcodes, archived_lines, current_lines)
+    
+    yield {
+        'record': 'trailer',
+        'significant_added': significant_added,
+        'significant_removed': significant_removed,
+        'stats': {
+            'total_lines': sum(counts.values()),
+            'added_lines': counts['add'],
+            'removed_lines': counts['remove'],
+            'changed_lines': counts['change'],
+            'is_identical': is_identical,
+            'total_changes': counts['add'] + counts['remove'] + counts['change']
+        }
+    }
+
+def get_diff_dates(timestamp):
+    """Returns the formatted archive date, the current date and a note if the archive date had to be adjusted."""
+    formatted_archive_date, current_date = get_formatted_dates(timestamp)
+    
+    # Check if the archive date is today or in the future
+    archive_date = datetime.datetime.strptime(formatted_archive_date, "%m-%d-%Y").date()
+    today = datetime.datetime.now().date()
+    
+    # Add a note if the date was adjusted
+    date_note = None
+    if archive_date >= today:
+        date_note = "Note: Archive dates cannot be today or in the future. The comparison is using yesterday's date instead."
+    
+    return formatted_archive_date, current_date, date_note
+
+def paginate_diff(diff_content, cursor=0, limit=500):
+    """
+    Returns one window of diff rows from a full diff result.
+    
+    Args:
+        diff_content (dict): A result from generate_diff_content
+        cursor (int): Index of the first row to return
+        limit (int): Maximum number of rows to return
+        
+    Returns:
+        dict: The rows, the cursor for the next window (None at the end) and the total row count
+    """
+    diff_data = diff_content['diff_data']
+    end = cursor + limit
+    return {
+        'diff_data': diff_data[cursor:end],
+        'next_cursor': end if end < len(diff_data) else None,
+        'total_rows': len(diff_data)
+    }
+
+def create_diff_data(opcodes, archived_lines, current_lines, include_word_diff=False):
+    """
+    Create structured diff data from SequenceMatcher-style opcodes.
+    
+    Rows are stored compactly in a DiffRows whose columns are filled a whole
+    opcode block at a time.
+    """
+    rows = DiffRows()
+    for opcode in opcodes:
+        add_opcode_rows(rows, opcode, archived_lines, current_lines, include_word_diff)
+    return rows
+
+def iter_diff_data(opcodes, archived_lines, current_lines, include_word_diff=False):
+    """
+    Yield structured diff rows one at a time from SequenceMatcher-style opcodes.
+    
+    Each opcode block is built as its own small DiffRows, numbered on from
+    the previous block, so streamed rows match create_diff_data exactly.
+    """
+    line_num = 0
+    for opcode in opcodes:
+        block = DiffRows(line_num)
+        add_opcode_rows(block, opcode, archived_lines, current_lines, include_word_diff)
+        yield from block
+        line_num += len(block)
+
+def add_opcode_rows(rows, opcode, archived_lines, current_lines, include_word_diff=False):
+    """Appends the rows of one SequenceMatcher-style opcode to a DiffRows."""
+    tag, i1, i2, j1, j2 = opcode
+    if tag == 'equal':
+        # For equal blocks, just add a few context lines
+        context_lines = min(3, i2 - i1)  # Show at most 3 context lines
+        if context_lines > 0:
+            rows.add_block('equal', archived_lines[i2 - context_lines:i2], current_lines[j1:j1 + context_lines])
+    elif tag == 'replace':
+        # Lines were changed, paired up one to one
+        size = min(i2 - i1, j2 - j1)
+        start = len(rows)
+        rows.add_block('change', archived_lines[i1:i1 + size], current_lines[j1:j1 + size])
+        if include_word_diff:
+            for offset in range(size):
+                rows.word_diffs[start + offset] = get_word_diff(archived_lines[i1 + offset], current_lines[j1 + offset])
+    elif tag == 'delete':
+        # Lines were removed
+        rows.add_block('remove', archived_lines[i1:i2], [''] * (i2 - i1))
+    elif tag == 'insert':
+        # Lines were added
+        rows.add_block('add', [''] * (j2 - j1), current_lines[j1:j2])
+
+def get_word_diffs(rows):
+    """Generate word-level diffs for a batch of {'old_text', 'new_text'} rows."""
+    with stage('word_diff'):
+        return [get_word_diff(str(row.get('old_text') or ''), str(row.get('new_text') or '')) for row in rows]
 
 def get_word_diff(old_line, new_line):
     """Generate word-level diff between two lines."""
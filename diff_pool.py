@@ -0,0 +1,178 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from diff_engine import get_opcodes, intern_lines, unique_common_anchors, merge_blocks, opcodes_from_blocks
+
+# Process pool settings, overridable through the environment; 0 workers diffs in-process
+DIFF_POOL_WORKERS = int(os.environ.get('DIFF_POOL_WORKERS', os.cpu_count() or 1))
+DIFF_POOL_QUEUE_DEPTH = int(os.environ.get('DIFF_POOL_QUEUE_DEPTH', max(DIFF_POOL_WORKERS, 1) * 4))
+DIFF_POOL_QUEUE_TIMEOUT = float(os.environ.get('DIFF_POOL_QUEUE_TIMEOUT', 5))
+# Documents with more lines than this (both sides together) are split into chunks
+DIFF_CHUNK_THRESHOLD = int(os.environ.get('DIFF_CHUNK_THRESHOLD', 20000))
+DIFF_CHUNK_LINES = int(os.environ.get('DIFF_CHUNK_LINES', 5000))
+
+
+class DiffPoolBusy(Exception):
+    """Raised when the diff pool's queue stays full for longer than the timeout."""
+
+
+_executor = None
+_executor_pid = None
+# Set once worker processes turn out to be unavailable (e.g. no /dev/shm on AWS Lambda)
+_pool_unavailable = False
+_executor_lock = threading.Lock()
+_queue_slots = threading.BoundedSemaphore(DIFF_POOL_QUEUE_DEPTH)
+
+def get_executor():
+    """Returns this process's diff pool, or None when diffs run in-process."""
+    global _executor, _executor_pid
+    if DIFF_POOL_WORKERS <= 0 or _pool_unavailable:
+        return None
+    with _executor_lock:
+        # A forked worker must not reuse its parent's pool
+        if _executor is None or _executor_pid != os.getpid():
+            try:
+                _executor = ProcessPoolExecutor(max_workers=DIFF_POOL_WORKERS)
+            except (OSError, NotImplementedError) as e:
+                disable_pool(e)
+                return None
+            _executor_pid = os.getpid()
+    return _executor
+
+def disable_pool(error):
+    """Falls back to diffing in-process for the rest of this process's life."""
+    global _executor, _pool_unavailable
+    print(f"Error starting diff worker processes, diffing in-process instead: {error}")
+    _pool_unavailable = True
+    _executor = None
+
+def reset_executor(executor, error):
+    """Drops a pool whose worker died so the next submit starts a fresh one."""
+    global _executor
+    with _executor_lock:
+        if _executor is not executor:
+            return
+        print(f"Error in diff worker process, restarting the pool: {error}")
+        _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+def run_inline(fn, *args):
+    """Runs fn(*args) right away, returning its outcome as a finished Future."""
+    future = Future()
+    try:
+        future.set_result(fn(*args))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+def submit(fn, *args, block=False):
+    """
+    Queues fn(*args) on the diff pool.
+
+    Args:
+        fn (callable): A picklable module-level function
+        block (bool): Wait for a free queue slot instead of giving up after DIFF_POOL_QUEUE_TIMEOUT
+
+    Returns:
+        Future: The pending result
+
+    Raises:
+        DiffPoolBusy: If no queue slot frees up in time
+    """
+    executor = get_executor()
+    if executor is None:
+        # Keep the same interface when the pool is disabled
+        return run_inline(fn, *args)
+
+    if not _queue_slots.acquire(timeout=None if block else DIFF_POOL_QUEUE_TIMEOUT):
+        raise DiffPoolBusy('Too many diffs are already queued')
+    try:
+        try:
+            future = executor.submit(fn, *args)
+        except BrokenProcessPool as e:
+            # A worker died since the last diff, so retry once on a fresh pool
+            reset_executor(executor, e)
+            executor = get_executor()
+            if executor is None:
+                _queue_slots.release()
+                return run_inline(fn, *args)
+            future = executor.submit(fn, *args)
+    except (OSError, NotImplementedError) as e:
+        # Worker processes are started lazily, so spawning can fail here too
+        _queue_slots.release()
+        disable_pool(e)
+        return run_inline(fn, *args)
+    except Exception:
+        _queue_slots.release()
+        raise
+    future.add_done_callback(lambda _: _queue_slots.release())
+    future.add_done_callback(lambda done: release_broken(executor, done))
+    return future
+
+def release_broken(executor, future):
+    """Resets the pool when one of its futures failed because a worker died."""
+    if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+        reset_executor(executor, future.exception())
+
+def get_result(future, fn, *args):
+    """
+    Waits for a future returned by submit(fn, *args).
+
+    If a worker process died while the call was queued or running, the pool
+    is replaced and the call is retried in-process rather than failing.
+    """
+    try:
+        return future.result()
+    except BrokenProcessPool:
+        return fn(*args)
+
+def compute_opcodes(archived_lines, current_lines, engine=None):
+    """
+    Computes line diff opcodes on the diff pool.
+
+    Large documents are split at lines that occur exactly once on both sides
+    (which a minimal diff keeps matched in the common case), the pieces are
+    diffed in parallel and their opcodes are stitched back together.
+
+    Raises:
+        DiffPoolBusy: If the pool's queue is full
+    """
+    if len(archived_lines) + len(current_lines) <= DIFF_CHUNK_THRESHOLD or get_executor() is None:
+        args = (archived_lines, current_lines, engine)
+        return get_result(submit(get_opcodes, *args), get_opcodes, *args)
+
+    a, b = intern_lines(archived_lines, current_lines)
+    chunks = split_at_anchors(a, b, DIFF_CHUNK_LINES)
+    futures = []
+    for i1, i2, j1, j2 in chunks:
+        args = (a[i1:i2], b[j1:j2], engine)
+        futures.append((i1, j1, args, submit(get_opcodes, *args)))
+
+    # Rebuild one opcode list from each chunk's matching blocks
+    blocks = []
+    for i1, j1, args, future in futures:
+        for tag, ci1, ci2, cj1, cj2 in get_result(future, get_opcodes, *args):
+            if tag == 'equal':
+                blocks.append((i1 + ci1, j1 + cj1, ci2 - ci1))
+    for (_, i2, _, j2), _ in zip(chunks, chunks[1:]):
+        # The anchor line between two chunks
+        blocks.append((i2, j2, 1))
+    return opcodes_from_blocks(merge_blocks(blocks), len(a), len(b))
+
+def split_at_anchors(a, b, chunk_lines):
+    """
+    Splits two ID sequences into aligned (i1, i2, j1, j2) chunks.
+
+    Consecutive chunks are separated by a single anchor line at (i2, j2) that
+    is unique to both sides; each chunk spans roughly chunk_lines lines.
+    """
+    anchors = unique_common_anchors(a, 0, len(a), b, 0, len(b))
+    chunks = []
+    i1 = j1 = 0
+    for i, j in anchors:
+        if i - i1 >= chunk_lines or j - j1 >= chunk_lines:
+            chunks.append((i1, i, j1, j))
+            i1, j1 = i + 1, j + 1
+    chunks.append((i1, len(a), j1, len(b)))
+    return chunks
@@ -0,0 +1,127 @@
+import json
+from json.encoder import encode_basestring_ascii
+
+# One-letter codes used to store row types and in the columnar wire format
+ROW_TYPES = {'equal': 'e', 'add': 'a', 'remove': 'r', 'change': 'c'}
+ROW_TYPE_NAMES = {ord(code): name for name, code in ROW_TYPES.items()}
+
+
+class DiffRows:
+    """
+    Column-oriented storage for diff rows.
+
+    Instead of one dict per row, rows live in parallel columns: a bytearray
+    of one-letter type codes and two lists of line strings shared with the
+    split input (so a row costs a byte and two pointers). Line numbers are
+    implicit: row i is line start + i + 1. Word diffs, which only changed
+    rows can have, are kept in a dict keyed by row index.
+
+    Indexing and iteration still return the familiar row dicts, built on
+    demand; to_json() writes JSON straight from the columns.
+    """
+
+    __slots__ = ('types', 'old_text', 'new_text', 'word_diffs', 'start', 'counts')
+
+    def __init__(self, start=0):
+        self.types = bytearray()
+        self.old_text = []
+        self.new_text = []
+        self.word_diffs = {}
+        self.start = start
+        # Rows per type, kept up to date as blocks are added
+        self.counts = dict.fromkeys(ROW_TYPES, 0)
+
+    def add_block(self, row_type, old_lines, new_lines):
+        """Appends len(old_lines) rows of one type; old_lines and new_lines must be equally long."""
+        self.types.extend(ROW_TYPES[row_type].encode('ascii') * len(old_lines))
+        self.old_text.extend(old_lines)
+        self.new_text.extend(new_lines)
+        self.counts[row_type] += len(old_lines)
+
+    def __len__(self):
+        return len(self.types)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(len(self.types))
+            window = DiffRows(self.start + start)
+            window.types = self.types[start:stop]
+            window.old_text = self.old_text[start:stop]
+            window.new_text = self.new_text[start:stop]
+            window.word_diffs = {i - start: wd for i, wd in self.word_diffs.items() if start <= i < stop}
+            for name, code in ROW_TYPES.items():
+                window.counts[name] = window.types.count(ord(code))
+            return window
+        if index < 0:
+            index += len(self.types)
+        row = {
+            'type': ROW_TYPE_NAMES[self.types[index]],
+            'line_num': self.start + index + 1,
+            'old_text': self.old_text[index],
+            'new_text': self.new_text[index]
+        }
+        if index in self.word_diffs:
+            row['word_diff'] = self.word_diffs[index]
+        return row
+
+    def __iter__(self):
+        for index in range(len(self.types)):
+            yield self[index]
+
+    @classmethod
+    def from_columnar(cls, data):
+        """Rebuilds rows from the parsed output of to_json(columnar=True)."""
+        rows = cls(data['start'])
+        rows.types = bytearray(data['types'], 'ascii')
+        rows.old_text = data['old_text']
+        rows.new_text = data['new_text']
+        rows.word_diffs = {int(index): wd for index, wd in data['word_diff'].items()}
+        for name, code in ROW_TYPES.items():
+            rows.counts[name] = rows.types.count(ord(code))
+        return rows
+
+    def to_json(self, columnar=False):
+        """
+        Serializes the rows without building a dict per row.
+
+        Args:
+            columnar (bool): Write one array per column instead of a list of row objects
+
+        Returns:
+            str: A JSON array of rows, or a columnar object with 'types' (one
+            letter per row, see 'type_codes'), 'old_text', 'new_text', the
+            'start' offset of the first line number and sparse 'word_diff'
+        """
+        if columnar:
+            return (
+                f'{{"format":"columnar","start":{self.start},'
+                f'"type_codes":{json.dumps({code: name for name, code in ROW_TYPES.items()})},'
+                f'"types":"{self.types.decode("ascii")}",'
+                f'"old_text":[{",".join(map(encode_basestring_ascii, self.old_text))}],'
+                f'"new_text":[{",".join(map(encode_basestring_ascii, self.new_text))}],'
+                f'"word_diff":{json.dumps({str(i): wd for i, wd in self.word_diffs.items()})}}}'
+            )
+
+        type_prefixes = {code: f'{{"type":"{name}","line_num":' for code, name in ROW_TYPE_NAMES.items()}
+        word_diffs = self.word_diffs
+        rows = [
+            f'{type_prefixes[code]}{self.start + index + 1},"old_text":{encode_basestring_ascii(old)},'
+            f'"new_text":{encode_basestring_ascii(new)}'
+            + (f',"word_diff":{json.dumps(word_diffs[index])}}}' if index in word_diffs else '}')
+            for index, (code, old, new) in enumerate(zip(self.types, self.old_text, self.new_text))
+        ]
+        return f'[{",".join(rows)}]'
+
+
+def dumps_json(data, columnar=False):
+    """Serializes a response dict to JSON, writing any DiffRows values straight from their columns."""
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, DiffRows):
+            encoded = value.to_json(columnar)
+        elif isinstance(value, dict):
+            encoded = dumps_json(value, columnar)
+        else:
+            encoded = json.dumps(value)
+        parts.append(f'{encode_basestring_ascii(str(key))}:{encoded}')
+    return f'{{{",".join(parts)}}}'
@@ -0,0 +1,143 @@
+import re
+import bisect
+import itertools
+from cache import ResultCache
+
+# Characters of context kept on each side of a match in search snippets
+SNIPPET_CONTEXT = 40
+
+# Rows whose type code is not 'e' (equal)
+CHANGE_ROW_PATTERN = re.compile(rb'[^e]')
+
+# Separators inside the search text; queries containing them cannot match
+SIDE_SEPARATOR = '\x00'
+ROW_SEPARATOR = '\n'
+
+
+class DiffIndex:
+    """
+    Search structures for one cached diff.
+
+    Every row's old and new text is lowercased once into a single search
+    text, together with the offset at which each row starts, so a query is
+    a run of str.find calls (each one skipping to the next row) plus a
+    bisect per hit. The sorted IDs (row positions) of every non-equal row
+    are precomputed for the change-only filter.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        pieces = [
+            f"{old_text}{SIDE_SEPARATOR}{new_text}".lower()
+            for old_text, new_text in zip(rows.old_text, rows.new_text)
+        ]
+        self.text = ROW_SEPARATOR.join(pieces)
+        # Row i spans text[row_starts[i]:row_starts[i + 1] - 1]
+        self.row_starts = list(itertools.accumulate((len(piece) + 1 for piece in pieces), initial=0))
+        self.change_rows = [match.start() for match in CHANGE_ROW_PATTERN.finditer(rows.types)]
+
+    def search(self, query, changes_only=False):
+        """Returns the IDs of rows whose old or new text contains query, ignoring case."""
+        needle = query.lower()
+        if not needle or SIDE_SEPARATOR in needle or ROW_SEPARATOR in needle:
+            return []
+
+        row_ids = []
+        text = self.text
+        row_starts = self.row_starts
+        position = text.find(needle)
+        while position != -1:
+            row_id = bisect.bisect_right(row_starts, position) - 1
+            row_ids.append(row_id)
+            # One hit per row is enough
+            position = text.find(needle, row_starts[row_id + 1])
+
+        if changes_only:
+            types = self.rows.types
+            row_ids = [row_id for row_id in row_ids if types[row_id] != ord('e')]
+        return row_ids
+
+
+def make_snippet(text, query):
+    """
+    Cuts the text around the first case-insensitive match of query.
+
+    Returns:
+        dict: The 'text' of the snippet and the 'start'/'end' of the match within it,
+        or None if the text does not contain the query
+    """
+    position = text.lower().find(query.lower())
+    if position < 0:
+        return None
+    start = max(position - SNIPPET_CONTEXT, 0)
+    end = min(position + len(query) + SNIPPET_CONTEXT, len(text))
+    prefix = '...' if start > 0 else ''
+    return {
+        'text': prefix + text[start:end] + ('...' if end < len(text) else ''),
+        'start': len(prefix) + position - start,
+        'end': len(prefix) + position - start + len(query)
+    }
+
+
+# Indexes are built on the first search of a diff and kept alongside it
+diff_indexes = ResultCache()
+
+def get_diff_index(diff_id, rows):
+    """Returns the search index for a cached diff, building it on first use."""
+    index = diff_indexes.get(diff_id)
+    if index is None or index.rows is not rows:
+        index = DiffIndex(rows)
+        diff_indexes.put(index, diff_id)
+    return index
+
+def search_diff(diff_id, rows, query, changes_only=False, cursor=0, limit=100):
+    """
+    Searches a cached diff and returns one window of matches with snippets.
+
+    Args:
+        diff_id (str): The diff result's ID
+        rows (DiffRows): The diff's rows
+        query (str): Text to look for in either version
+        changes_only (bool): Only match rows that are not equal
+        cursor (int): Index of the first match to return
+        limit (int): Maximum number of matches to return
+
+    Returns:
+        dict: The matches (row ID, line number, type and a snippet per side that
+        contains the query), the total match count and the next cursor
+    """
+    row_ids = get_diff_index(diff_id, rows).search(query, changes_only)
+    end = cursor + limit
+    matches = []
+    for row_id in row_ids[cursor:end]:
+        row = rows[row_id]
+        matches.append({
+            'row_id': row_id,
+            'line_num': row['line_num'],
+            'type': row['type'],
+            'old_snippet': make_snippet(row['old_text'], query),
+            'new_snippet': make_snippet(row['new_text'], query)
+        })
+    return {
+        'query': query,
+        'matches': matches,
+        'total_matches': len(row_ids),
+        'next_cursor': end if end < len(row_ids) else None
+    }
+
+def list_changes(diff_id, rows, cursor=0, limit=500):
+    """
+    Returns one window of the non-equal rows of a cached diff.
+
+    Returns:
+        dict: The rows, their 'row_ids', the total number of changed rows and the next cursor
+    """
+    change_rows = get_diff_index(diff_id, rows).change_rows
+    end = cursor + limit
+    row_ids = change_rows[cursor:end]
+    return {
+        'row_ids': row_ids,
+        'diff_data': [rows[row_id] for row_id in row_ids],
+        'total_changes': len(change_rows),
+        'next_cursor': end if end < len(change_rows) else None
+    }
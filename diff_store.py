@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import zlib
+import sqlite3
+import threading
+from cache import CACHE_DIR, CACHE_DISK_ENABLED, ResultCache
+from diff_engine import DIFF_ENGINE
+from diff_rows import DiffRows, dumps_json
+
+# Diff store settings, overridable through the environment
+DIFF_STORE_ENABLED = os.environ.get('DIFF_STORE_ENABLED', '1') != '0' and CACHE_DISK_ENABLED
+DIFF_STORE_PATH = os.environ.get('DIFF_STORE_PATH', os.path.join(CACHE_DIR, 'diffs.sqlite3'))
+DIFF_STORE_MAX_BYTES = int(os.environ.get('DIFF_STORE_MAX_BYTES', 256 * 1024 * 1024))
+DIFF_STORE_COMPRESSION = int(os.environ.get('DIFF_STORE_COMPRESSION', 1))
+DIFF_STORE_MAX_RESULTS = int(os.environ.get('DIFF_STORE_MAX_RESULTS', 1024))
+
+# The parts of a diff result that depend only on the two texts and the options
+STORED_FIELDS = ('diff_data', 'stats', 'significant_added', 'significant_removed')
+
+
+def diff_key(archived_hash, current_hash, engine=None, word_diff=False):
+    """Builds the store key for a diff of two normalized texts, given by their get_hash digests."""
+    return f"{engine or DIFF_ENGINE}|{int(bool(word_diff))}|{archived_hash}|{current_hash}"
+
+
+class DiffStore:
+    """
+    Persistent memo of finished diffs, keyed by content hashes and options.
+
+    Each entry holds the rows (in the columnar JSON format of DiffRows),
+    stats and significant changes of one diff as a zlib-compressed blob in
+    a SQLite file. The file is bounded by the total blob size, evicting the
+    least recently used entries first. URL and dates are not stored: they
+    are filled in per request, so a hit can serve any URL or timestamp
+    whose normalized texts match.
+
+    A second table holds whole diff results by their opaque ID until they
+    expire, as the shared backend of diff_results.
+    """
+
+    def __init__(self, path=None, max_bytes=DIFF_STORE_MAX_BYTES, max_results=DIFF_STORE_MAX_RESULTS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_results = max_results
+        self._lock = threading.Lock()
+        self._db = None
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+    def get(self, key):
+        """Returns the stored fields of a diff as a dict with a DiffRows 'diff_data', or None."""
+        with self._lock:
+            try:
+                db = self._connect()
+                if db is None:
+                    return None
+                row = db.execute('SELECT blob FROM diffs WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    self.stats['misses'] += 1
+                    return None
+                db.execute('UPDATE diffs SET last_access = ? WHERE key = ?', (time.time(), key))
+                db.commit()
+                self.stats['hits'] += 1
+            except sqlite3.Error as e:
+                print(f"Diff store read failed for {key}: {e}")
+                return None
+
+        stored = json.loads(zlib.decompress(row[0]))
+        stored['diff_data'] = DiffRows.from_columnar(stored['diff_data'])
+        return stored
+
+    def put(self, key, diff_content):
+        """Stores the content-dependent fields of a diff result under key."""
+        if self.path is None:
+            return
+        encoded = dumps_json({field: diff_content[field] for field in STORED_FIELDS}, columnar=True)
+        blob = zlib.compress(encoded.encode('utf-8'), DIFF_STORE_COMPRESSION)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                db = self._connect()
+                db.execute(
+                    'INSERT OR REPLACE INTO diffs (key, blob, size, last_access) VALUES (?, ?, ?, ?)',
+                    (key, blob, len(blob), time.time())
+                )
+                self._evict(db)
+                db.commit()
+                self.stats['stores'] += 1
+            except sqlite3.Error as e:
+                print(f"Diff store write failed for {key}: {e}")
+
+    def get_result(self, result_id):
+        """
+        Returns a stored diff result by its ID.
+
+        Returns:
+            tuple: (expires_at, result), or None if it is unknown or expired
+        """
+        with self._lock:
+            try:
+                db = self._connect()
+                if db is None:
+                    return None
+                row = db.execute(
+                    'SELECT expires_at, blob FROM results WHERE id = ? AND expires_at > ?',
+                    (result_id, time.time())
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Diff store read failed for result {result_id}: {e}")
+                return None
+        if row is None:
+            return None
+
+        result = json.loads(zlib.decompress(row[1]))
+        result['diff_data'] = DiffRows.from_columnar(result['diff_data'])
+        return row[0], result
+
+    def put_result(self, result_id, result, expires_at):
+        """Stores a whole diff result under its ID until expires_at."""
+        if self.path is None:
+            return
+        blob = zlib.compress(dumps_json(result, columnar=True).encode('utf-8'), DIFF_STORE_COMPRESSION)
+        with self._lock:
+            try:
+                db = self._connect()
+                db.execute(
+                    'INSERT OR REPLACE INTO results (id, blob, expires_at) VALUES (?, ?, ?)',
+                    (result_id, blob, expires_at)
+                )
+                # Drop expired results, then the oldest ones beyond the bound
+                db.execute('DELETE FROM results WHERE expires_at <= ?', (time.time(),))
+                db.execute(
+                    'DELETE FROM results WHERE id NOT IN (SELECT id FROM results ORDER BY expires_at DESC LIMIT ?)',
+                    (self.max_results,)
+                )
+                db.commit()
+            except sqlite3.Error as e:
+                print(f"Diff store write failed for result {result_id}: {e}")
+
+    def get_stats(self):
+        """Returns hit/miss counters and the current number and size of entries."""
+        with self._lock:
+            stats = dict(self.stats)
+            db = self._connect()
+            if db is not None:
+                stats['entries'], stats['bytes'] = db.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM diffs').fetchone()
+        return stats
+
+    def _connect(self):
+        if self.path is None:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.executescript('''
+                CREATE TABLE IF NOT EXISTS diffs (
+                    key TEXT PRIMARY KEY,
+                    blob BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS diffs_last_access ON diffs (last_access);
+                CREATE TABLE IF NOT EXISTS results (
+                    id TEXT PRIMARY KEY,
+                    blob BLOB NOT NULL,
+                    expires_at REAL NOT NULL
+                );
+            ''')
+        return self._db
+
+    def _evict(self, db):
+        total = db.execute('SELECT COALESCE(SUM(size), 0) FROM diffs').fetchone()[0]
+        while total > self.max_bytes:
+            oldest = db.execute('SELECT key, size FROM diffs ORDER BY last_access LIMIT 1').fetchone()
+            if oldest is None:
+                break
+            db.execute('DELETE FROM diffs WHERE key = ?', (oldest[0],))
+            self.stats['evictions'] += 1
+            total -= oldest[1]
+
+
+diff_store = DiffStore(DIFF_STORE_PATH if DIFF_STORE_ENABLED else None)
+
+# Finished diffs by ID, for follow-up requests (further pages, searches) on any worker
+diff_results = ResultCache(backend=diff_store)
@@ -0,0 +1,114 @@
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from comparison import compare_pages, ComparisonError
+from diff_store import diff_results
+
+# Job queue settings, overridable through the environment
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 4))
+JOB_TTL = float(os.environ.get('JOB_TTL', 3600))
+
+# Rough progress reported for each stage of the pipeline
+JOB_PROGRESS = {'queued': 0, 'fetching': 10, 'diffing': 60, 'rendering': 85, 'done': 100, 'error': 100}
+
+
+class JobQueue:
+    """
+    In-process queue of background comparisons.
+
+    Jobs run the same fetch and diff pipeline as /generate-diff on a thread
+    pool and leave their result in the shared diff result cache. Submitting
+    a comparison identical to one still in flight gives the caller its own
+    job (with its own page size, format and warning) attached to the
+    existing computation instead of starting a second one.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self._jobs = {}
+        # Coalescing key -> the unfinished computation for that comparison
+        self._in_flight = {}
+
+    def submit(self, options):
+        """
+        Queues a comparison described by validated /generate-diff options.
+
+        Returns:
+            tuple: (job, coalesced) where coalesced is True if an in-flight computation was reused
+        """
+        # Only the options that change the diff itself; presentation options stay with each job
+        key = (options['url'], options['timestamp'], options['engine'], options['word_diff'], options['rules'].fingerprint)
+        with self._lock:
+            self._prune()
+            computation = self._in_flight.get(key)
+            coalesced = computation is not None
+            if not coalesced:
+                computation = {'status': 'queued', 'finished_at': None, 'diff_id': None, 'error': None}
+                self._in_flight[key] = computation
+
+            job = {'id': uuid.uuid4().hex, 'options': options, 'created_at': time.time(), 'computation': computation}
+            self._jobs[job['id']] = job
+
+        if not coalesced:
+            self._executor.submit(self._run, computation, key, options)
+        return job, coalesced
+
+    def get(self, job_id):
+        """Returns the job with the given ID, or None if it is unknown or expired."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def describe(self, job):
+        """Returns the public view of a job."""
+        computation = job['computation']
+        description = {
+            'job_id': job['id'],
+            'status': computation['status'],
+            'progress': JOB_PROGRESS[computation['status']],
+            'url': job['options']['url'],
+            'timestamp': job['options']['timestamp']
+        }
+        if computation['error']:
+            description['error'] = computation['error']
+        return description
+
+    def _run(self, computation, key, options):
+        try:
+            diff_content = compare_pages(
+                options['url'], options['timestamp'], options['engine'], options['word_diff'],
+                progress=lambda stage: self._set_status(computation, stage), rules=options['rules']
+            )
+            computation['diff_id'] = diff_results.put(diff_content)
+            self._set_status(computation, 'done')
+        except ComparisonError as e:
+            computation['error'] = e.message
+            self._set_status(computation, 'error')
+        except Exception as e:
+            print(f"Job for {options['url']} failed: {e}")
+            computation['error'] = 'Comparison failed unexpectedly'
+            self._set_status(computation, 'error')
+        finally:
+            computation['finished_at'] = time.time()
+            with self._lock:
+                if self._in_flight.get(key) is computation:
+                    del self._in_flight[key]
+
+    def _set_status(self, computation, status):
+        computation['status'] = status
+
+    def _prune(self):
+        # Forget finished jobs once their TTL has passed
+        cutoff = time.time() - self.ttl
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job['computation']['finished_at'] is not None and job['computation']['finished_at'] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+job_queue = JobQueue()
@@ -1,7 +1,12 @@
-import os
+import sys
+import json
+import time
+import argparse
 from web_fetcher import get_page_text, get_wayback_snapshot
 from utils import get_hash, extract_meaningful_content
-from diff_generator import generate_diff_html
+from diff_generator import generate_diff_content
+from batch import run_batch
+from monitor import MonitorStore, run_monitor, MONITOR_DB
 
 def main():
     target_url = "https://www.newyorkfed.org/aboutthefed"
@@ -33,17 +38,116 @@ def main():
             clean_current = extract_meaningful_content(current_text)
             clean_archived = extract_meaningful_content(archived_text)
             
-            # Generate and save HTML diff file
-            diff_file = generate_diff_html(clean_current, clean_archived, target_url, timestamp)
-            print(f"\nDifferences have been saved to {diff_file}")
-            
-            # Open the diff file in the default browser
-            print("Opening diff in your browser...")
-            os.system(f"open {diff_file}")
+            # Generate the diff and summarize it
+            diff_content = generate_diff_content(clean_current, clean_archived, target_url, timestamp)
+            stats = diff_content['stats']
+            print(f"\n{stats['added_lines']} additions, {stats['removed_lines']} removals, {stats['changed_lines']} changes")
+            for line in diff_content['significant_added']:
+                print(f"  + {line}")
+            for line in diff_content['significant_removed']:
+                print(f"  - {line}")
         else:
             print("The page content is identical to the archived snapshot.")
     else:
         print("Failed to retrieve content from the archived snapshot.")
 
+def read_batch_file(path):
+    """Reads (url, timestamp) pairs from a file with one 'url [timestamp]' entry per line."""
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split()
+            items.append((parts[0], parts[1] if len(parts) > 1 else "20220101"))
+    return items
+
+def batch_main(path, output=None, engine=None, workers=None, similarity_threshold=None):
+    """Compares every URL listed in a batch file and prints a line per URL."""
+    items = read_batch_file(path)
+    print(f"Comparing {len(items)} URLs...")
+    batch_result = run_batch(items, engine=engine, fetch_workers=workers, similarity_threshold=similarity_threshold)
+
+    for result in batch_result['results']:
+        if result['status'] == 'ok':
+            stats = result['stats']
+            if stats['is_identical']:
+                state = "identical"
+            elif stats.get('near_identical'):
+                state = f"near-identical ({stats['similarity']:.0%} similar, not diffed)"
+            else:
+                state = f"{stats['total_changes']} changes"
+            print(f"OK     {result['url']} ({result['timestamp']}): {state}")
+        else:
+            print(f"ERROR  {result['url']} ({result['timestamp']}): {result['error']}")
+
+    summary = batch_result['summary']
+    print(f"\n{summary['succeeded']}/{summary['total']} compared, {summary['changed']} changed, {summary['failed']} failed")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(batch_result, f, indent=2)
+        print(f"Results have been saved to {output}")
+
+    return 0 if summary['failed'] == 0 else 1
+
+def read_watchlist(path):
+    """Reads the URLs to monitor from a file with one URL per line (anything after it is ignored)."""
+    urls = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                urls.append(line.split()[0])
+    return urls
+
+def print_round(round_result):
+    """Prints a line per URL checked in one monitor round, plus a summary."""
+    for result in round_result['results']:
+        outcome = result['outcome']
+        if outcome == 'changed':
+            stats = result['stats']
+            state = (f"changed: {stats['added_lines']} additions, {stats['removed_lines']} removals, "
+                     f"{stats['changed_lines']} changes (diffed in {result['diff_ms']} ms)")
+        elif outcome == 'error':
+            state = f"error: {result['error']}"
+        else:
+            state = outcome.replace('_', ' ')
+        print(f"{time.strftime('%H:%M:%S')}  {result['url']}: {state}")
+
+    summary = round_result['summary']
+    print(f"Checked {len(round_result['results'])} URLs: {summary['changed']} changed, "
+          f"{summary['unchanged'] + summary['not_modified']} unchanged ({summary['not_modified']} not modified), "
+          f"{summary['baseline']} new, {summary['error']} failed\n")
+
+def monitor_main(path, interval=None, db_path=None, engine=None, workers=None, once=False):
+    """Re-checks every URL in a watchlist on a schedule, diffing each against its last stored version."""
+    urls = read_watchlist(path)
+    store = MonitorStore(db_path or MONITOR_DB)
+    print(f"Monitoring {len(urls)} URLs (baselines in {store.path})")
+    try:
+        run_monitor(store, urls, interval, engine=engine, workers=workers, rounds=1 if once else None, on_round=print_round)
+    except KeyboardInterrupt:
+        print("Monitoring stopped")
+    return 0
+
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compare web pages with their Wayback Machine snapshots.")
+    parser.add_argument('--batch', metavar='FILE', help="file with one 'url [timestamp]' entry per line")
+    parser.add_argument('--output', metavar='FILE', help="write batch results as JSON to this file")
+    parser.add_argument('--engine', help="diff engine: patience, myers or difflib")
+    parser.add_argument('--workers', type=int, help="number of concurrent fetches in batch mode")
+    parser.add_argument('--similarity', type=float, metavar='RATIO',
+                        help="skip the diff for pages at least this similar (0-1) in batch mode")
+    parser.add_argument('--monitor', metavar='FILE', help="watchlist with one URL per line to re-check on a schedule")
+    parser.add_argument('--interval', type=float, metavar='SECONDS', help="seconds between monitor rounds")
+    parser.add_argument('--monitor-db', metavar='FILE', help=f"SQLite file for monitor baselines and run stats (default: {MONITOR_DB})")
+    parser.add_argument('--once', action='store_true', help="run a single monitor round and exit")
+    args = parser.parse_args()
+
+    if args.monitor:
+        sys.exit(monitor_main(args.monitor, args.interval, args.monitor_db, args.engine, args.workers, args.once))
+    if args.batch:
+        sys.exit(batch_main(args.batch, args.output, args.engine, args.workers, args.similarity))
+    main()
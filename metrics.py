@@ -0,0 +1,191 @@
+import os
+import time
+import random
+import bisect
+import cProfile
+import threading
+import contextvars
+from contextlib import contextmanager
+from cache import CACHE_DIR
+
+# Instrumentation settings, overridable through the environment
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') != '0'
+METRICS_PREFIX = 'webdiff'
+# Histogram bucket bounds in seconds
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Fraction of requests run under cProfile; only profiles of requests slower than PROFILE_MIN_MS are kept
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_MIN_MS = float(os.environ.get('PROFILE_MIN_MS', 1000))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label value, in the Prometheus exposition format."""
+
+    def __init__(self, name, help_text, label, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        # label value -> [count per bucket (plus +Inf), sum]
+        self._series = {}
+
+    def observe(self, label_value, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {label_value: (list(counts), total) for label_value, (counts, total) in self._series.items()}
+        for label_value, (counts, total) in sorted(series.items()):
+            labels = f'{self.label}="{label_value}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class RequestMetrics:
+    """Stage durations and counters collected while serving one request."""
+
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        # Stages that run in several threads (e.g. extraction of both pages) are summed
+        self.stages = {}
+        self.counters = {}
+        self.profiler = None
+
+    def add_stage(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def add_count(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def server_timing(self, total):
+        """Formats the stages (in ms) and counters as a Server-Timing header value."""
+        with self._lock:
+            entries = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.stages.items()]
+            entries.extend(f'{name};desc="{value}"' for name, value in self.counters.items())
+        entries.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(entries)
+
+
+stage_durations = Histogram(f'{METRICS_PREFIX}_stage_duration_seconds', 'Time spent in each processing stage', 'stage')
+request_durations = Histogram(f'{METRICS_PREFIX}_request_duration_seconds', 'Time spent serving each endpoint', 'endpoint')
+_counters = {}
+_counters_lock = threading.Lock()
+
+# The request being served; copied into fetch threads so their stages are attributed to it
+current_request = contextvars.ContextVar('current_request', default=None)
+
+_profile_lock = threading.Lock()
+
+
+def observe_stage(name, seconds):
+    """Records the duration of one stage for the current request and the stage histogram."""
+    if not METRICS_ENABLED:
+        return
+    stage_durations.observe(name, seconds)
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.add_stage(name, seconds)
+
+@contextmanager
+def stage(name):
+    """Times the enclosed block as one stage."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+def count(name, value=1):
+    """Adds to a counter (e.g. bytes fetched, cache hits) for the current request and in total."""
+    if not METRICS_ENABLED:
+        return
+    with _counters_lock:
+        _counters[name] = _counters.get(name, 0) + value
+    request_metrics = current_request.get()
+    if request_metrics is not None:
+        request_metrics.add_count(name, value)
+
+def submit(executor, fn, *args):
+    """Submits fn to an executor so that its stages count towards the current request."""
+    return executor.submit(contextvars.copy_context().run, fn, *args)
+
+
+def start_request(endpoint):
+    """Starts collecting metrics for a request, profiling it if it is sampled."""
+    request_metrics = RequestMetrics(endpoint)
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE and _profile_lock.acquire(blocking=False):
+        # Only one profiler can be active per process; cProfile only sees the request thread
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            request_metrics.profiler = profiler
+        except ValueError as e:
+            _profile_lock.release()
+            print(f"Error starting profiler: {e}")
+    current_request.set(request_metrics)
+    return request_metrics
+
+def finish_request(request_metrics):
+    """
+    Stops collecting metrics for a request.
+
+    Returns:
+        str: The Server-Timing header value for the response
+    """
+    total = time.perf_counter() - request_metrics.started
+    current_request.set(None)
+    if METRICS_ENABLED:
+        request_durations.observe(request_metrics.endpoint, total)
+
+    profiler = request_metrics.profiler
+    if profiler is not None:
+        profiler.disable()
+        _profile_lock.release()
+        # Only outliers are worth keeping
+        if total * 1000 >= PROFILE_MIN_MS:
+            path = os.path.join(PROFILE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{request_metrics.endpoint}-{total * 1000:.0f}ms.prof")
+            try:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+                profiler.dump_stats(path)
+                print(f"Saved profile of slow {request_metrics.endpoint} request to {path}")
+            except OSError as e:
+                print(f"Error saving profile to {path}: {e}")
+
+    return request_metrics.server_timing(total)
+
+def render_metrics(gauges=None, counters=None):
+    """
+    Renders every histogram and counter in the Prometheus text format.
+
+    Args:
+        gauges (dict): Optional extra values (e.g. cache sizes) exported as gauges by name
+        counters (dict): Optional running totals kept elsewhere (e.g. connection pool stats), exported as counters
+    """
+    lines = stage_durations.render() + request_durations.render()
+    with _counters_lock:
+        counters = dict(counters or {}, **_counters)
+    for name, value in sorted(counters.items()):
+        metric = f'{METRICS_PREFIX}_{name}_total'
+        lines.extend((f'# TYPE {metric} counter', f'{metric} {value}'))
+    for name, value in sorted((gauges or {}).items()):
+        metric = f'{METRICS_PREFIX}_{name}'
+        lines.extend((f'# TYPE {metric} gauge', f'{metric} {value}'))
+    return '\n'.join(lines) + '\n'
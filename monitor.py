@@ -0,0 +1,228 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from web_fetcher import fetch_page
+from text_extractor import DEFAULT_RULES
+from utils import extract_meaningful_content, get_hash
+from boilerplate import clean_pair
+from batch import diff_stats
+import diff_pool
+
+# Monitor settings, overridable through the environment. Baselines are durable state,
+# so they live in the working directory rather than in the (temporary) cache directory
+MONITOR_DB = os.environ.get('MONITOR_DB', 'monitor.sqlite3')
+MONITOR_INTERVAL = float(os.environ.get('MONITOR_INTERVAL', 3600))
+MONITOR_WORKERS = int(os.environ.get('MONITOR_WORKERS', 8))
+
+
+class MonitorStore:
+    """
+    SQLite store of the last known version of each watched page.
+
+    The pages table keeps one baseline per URL (its cleaned text, content
+    hash, HTTP validators and the extraction profile it was produced with);
+    the runs table keeps one row of stats per check.
+    """
+
+    def __init__(self, path=MONITOR_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                profile TEXT NOT NULL,
+                text TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                checked_at REAL NOT NULL,
+                changed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                checked_at REAL NOT NULL,
+                outcome TEXT NOT NULL,
+                content_hash TEXT,
+                fetch_ms REAL,
+                diff_ms REAL,
+                added_lines INTEGER,
+                removed_lines INTEGER,
+                changed_lines INTEGER,
+                total_changes INTEGER,
+                details TEXT
+            );
+            CREATE INDEX IF NOT EXISTS runs_url ON runs (url, checked_at);
+        ''')
+
+    def get_page(self, url):
+        """Returns the stored baseline for url as a dict, or None if it has never been checked."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT profile, text, content_hash, etag, last_modified, checked_at, changed_at '
+                'FROM pages WHERE url = ?',
+                (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        profile, text, content_hash, etag, last_modified, checked_at, changed_at = row
+        return {
+            'profile': profile, 'text': text, 'content_hash': content_hash,
+            'validators': {'etag': etag, 'last_modified': last_modified},
+            'checked_at': checked_at, 'changed_at': changed_at
+        }
+
+    def save_page(self, url, profile, text, content_hash, validators, checked_at):
+        """Replaces the baseline for url with a new version of the page."""
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO pages '
+                '(url, profile, text, content_hash, etag, last_modified, checked_at, changed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, profile, text, content_hash, validators.get('etag'), validators.get('last_modified'),
+                 checked_at, checked_at)
+            )
+            self._db.commit()
+
+    def touch_page(self, url, validators, checked_at):
+        """Records that the baseline is still current, keeping the newest validators."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE pages SET etag = ?, last_modified = ?, checked_at = ? WHERE url = ?',
+                (validators.get('etag'), validators.get('last_modified'), checked_at, url)
+            )
+            self._db.commit()
+
+    def record_run(self, result):
+        """Appends the stats of one check to the runs table."""
+        stats = result.get('stats') or {}
+        details = {key: result[key] for key in ('error', 'significant_added', 'significant_removed') if key in result}
+        try:
+            with self._lock:
+                self._db.execute(
+                    'INSERT INTO runs (url, checked_at, outcome, content_hash, fetch_ms, diff_ms, '
+                    'added_lines, removed_lines, changed_lines, total_changes, details) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (result['url'], result['checked_at'], result['outcome'], result.get('content_hash'),
+                     result.get('fetch_ms'), result.get('diff_ms'), stats.get('added_lines'),
+                     stats.get('removed_lines'), stats.get('changed_lines'), stats.get('total_changes'),
+                     json.dumps(details) if details else None)
+                )
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"Error recording monitor run for {result['url']}: {e}")
+
+
+def check_url(store, url, rules=None, engine=None):
+    """
+    Re-checks one watched page against its stored baseline.
+
+    The baseline's validators make the fetch conditional, so an unchanged
+    page usually costs a single 304. A full response whose content hash
+    matches the baseline is not diffed either; only a changed hash runs a
+    diff, after which the new version becomes the baseline.
+
+    Args:
+        store (MonitorStore): Where baselines and run stats are kept
+        url (str): The live URL
+        rules (ExtractionRules): Boilerplate rules; defaults to DEFAULT_RULES
+        engine (str): Optional diff engine name
+
+    Returns:
+        dict: The run's outcome ('baseline', 'not_modified', 'unchanged', 'changed'
+        or 'error'), its timings and, for changed pages, the diff stats
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    checked_at = time.time()
+    result = {'url': url, 'checked_at': checked_at}
+    baseline = store.get_page(url)
+    # Text extracted under other rules is not comparable, so start over
+    if baseline is not None and baseline['profile'] != rules.fingerprint:
+        baseline = None
+
+    start = time.perf_counter()
+    text, validators, not_modified = fetch_page(url, baseline['validators'] if baseline else None, rules)
+    result['fetch_ms'] = round((time.perf_counter() - start) * 1000, 1)
+
+    if not_modified:
+        store.touch_page(url, validators, checked_at)
+        result.update(outcome='not_modified', content_hash=baseline['content_hash'])
+    elif not text:
+        result.update(outcome='error', error='Failed to fetch content')
+    else:
+        clean_text = extract_meaningful_content(text)
+        content_hash = get_hash(clean_text)
+        result['content_hash'] = content_hash
+        if baseline is None:
+            store.save_page(url, rules.fingerprint, clean_text, content_hash, validators, checked_at)
+            result['outcome'] = 'baseline'
+        elif content_hash == baseline['content_hash']:
+            store.touch_page(url, validators, checked_at)
+            result['outcome'] = 'unchanged'
+        else:
+            clean_current, clean_baseline = clean_pair(url, clean_text, baseline['text'])
+            timestamp = time.strftime('%Y%m%d', time.localtime(baseline['changed_at']))
+            start = time.perf_counter()
+            # Monitor rounds wait for queue space rather than failing when the pool is busy
+            args = (clean_current, clean_baseline, url, timestamp, engine)
+            result.update(diff_pool.get_result(diff_pool.submit(diff_stats, *args, block=True), diff_stats, *args))
+            result['diff_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            store.save_page(url, rules.fingerprint, clean_text, content_hash, validators, checked_at)
+            result['outcome'] = 'changed'
+
+    store.record_run(result)
+    return result
+
+def run_round(store, urls, rules=None, engine=None, workers=None):
+    """
+    Checks every watched URL once, side by side.
+
+    Returns:
+        dict: Per-URL results in watchlist order and a count per outcome
+    """
+    def check(url):
+        try:
+            return check_url(store, url, rules, engine)
+        except Exception as e:
+            result = {'url': url, 'checked_at': time.time(), 'outcome': 'error', 'error': str(e)}
+            store.record_run(result)
+            return result
+
+    with ThreadPoolExecutor(max_workers=workers or MONITOR_WORKERS) as executor:
+        results = list(executor.map(check, urls))
+
+    summary = dict.fromkeys(('baseline', 'not_modified', 'unchanged', 'changed', 'error'), 0)
+    for result in results:
+        summary[result['outcome']] += 1
+    return {'results': results, 'summary': summary}
+
+def run_monitor(store, urls, interval=None, rules=None, engine=None, workers=None, rounds=None, on_round=None):
+    """
+    Re-checks the watchlist every interval seconds.
+
+    Args:
+        store (MonitorStore): Where baselines and run stats are kept
+        urls (list): The watched URLs
+        interval (float): Seconds between the starts of two rounds; defaults to MONITOR_INTERVAL
+        rules (ExtractionRules): Boilerplate rules; defaults to DEFAULT_RULES
+        engine (str): Optional diff engine name
+        workers (int): Number of concurrent checks
+        rounds (int): Stop after this many rounds; None runs until interrupted
+        on_round (callable): Called with each round's result
+    """
+    interval = MONITOR_INTERVAL if interval is None else interval
+    completed = 0
+    while rounds is None or completed < rounds:
+        started = time.monotonic()
+        round_result = run_round(store, urls, rules, engine, workers)
+        completed += 1
+        if on_round is not None:
+            on_round(round_result)
+        if rounds is not None and completed >= rounds:
+            break
+        time.sleep(max(interval - (time.monotonic() - started), 0))
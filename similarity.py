@@ -0,0 +1,109 @@
+import os
+import heapq
+import zlib
+from utils import get_hash
+from cache import snapshot_cache
+
+# Sketch settings, overridable through the environment
+SKETCH_SIZE = int(os.environ.get('SKETCH_SIZE', 128))
+# Pages at least this similar skip the diff in batch runs; 1.0 only skips identical pages
+NEAR_IDENTICAL_THRESHOLD = float(os.environ.get('NEAR_IDENTICAL_THRESHOLD', 1.0))
+
+
+def shingle_hashes(text):
+    """
+    Returns the set of 64-bit hashes of every pair of consecutive lines.
+
+    Each line is hashed once with CRC-32 and neighbouring line hashes are
+    packed into one 64-bit value, then scrambled by an odd multiplier (a
+    bijection) so the smallest values are not biased towards any text.
+    """
+    line_hashes = [zlib.crc32(line) for line in text.encode('utf-8').split(b'\n')]
+    if len(line_hashes) == 1:
+        line_hashes.append(0)
+    return {
+        ((first << 32 | second) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        for first, second in zip(line_hashes, line_hashes[1:])
+    }
+
+
+def build_sketch(text):
+    """
+    Builds a bottom-k MinHash sketch of a text's line shingles.
+
+    Keeping the SKETCH_SIZE smallest distinct shingle hashes needs one hash
+    per shingle (rather than one per shingle and permutation) and is enough
+    to estimate the Jaccard similarity of two texts.
+
+    Returns:
+        tuple: The sorted hashes
+    """
+    return tuple(heapq.nsmallest(SKETCH_SIZE, shingle_hashes(text)))
+
+
+def get_sketch(text, content_hash=None):
+    """Returns the sketch of text, reusing the one stored next to the cached snapshots."""
+    key = f"sketch|{content_hash or get_hash(text)}"
+    cached = snapshot_cache.get(key)
+    if cached is not None:
+        return tuple(int(value, 16) for value in cached.split())
+    sketch = build_sketch(text)
+    # Sketches are addressed by content, so they never go stale
+    snapshot_cache.put(key, ' '.join(f'{value:x}' for value in sketch))
+    return sketch
+
+
+def estimate_similarity(sketch_a, sketch_b):
+    """Estimates the Jaccard similarity of the shingle sets behind two sketches."""
+    if not sketch_a and not sketch_b:
+        return 1.0
+    set_a = set(sketch_a)
+    set_b = set(sketch_b)
+    union = heapq.nsmallest(SKETCH_SIZE, set_a | set_b)
+    shared = sum(1 for value in union if value in set_a and value in set_b)
+    return shared / len(union)
+
+
+def check_similarity(archived_text, current_text, threshold=None):
+    """
+    Classifies two normalized texts before any diff is run.
+
+    Identical texts are recognized by their content hash. Otherwise, when a
+    threshold below 1.0 applies, the cached sketches estimate how similar
+    the texts are.
+
+    Args:
+        archived_text (str): The cleaned archived text
+        current_text (str): The cleaned current text
+        threshold (float): Similarity at or above which pages count as near-identical;
+            defaults to NEAR_IDENTICAL_THRESHOLD
+
+    Returns:
+        tuple: (verdict, similarity) where verdict is 'identical', 'near_identical'
+        or 'different' and similarity is None if no sketch was needed
+    """
+    archived_hash = get_hash(archived_text)
+    current_hash = get_hash(current_text)
+    if archived_hash == current_hash:
+        return 'identical', 1.0
+
+    threshold = NEAR_IDENTICAL_THRESHOLD if threshold is None else threshold
+    if threshold >= 1.0:
+        return 'different', None
+
+    similarity = estimate_similarity(get_sketch(archived_text, archived_hash), get_sketch(current_text, current_hash))
+    return ('near_identical' if similarity >= threshold else 'different'), similarity
+
+
+def identical_opcodes(line_count):
+    """Returns the opcodes of a diff between two identical texts of line_count lines."""
+    return [('equal', 0, line_count, 0, line_count)] if line_count else []
+
+
+def near_identical_result(similarity):
+    """Returns the summary reported for a page whose diff was skipped as near-identical."""
+    return {
+        'stats': {'is_identical': False, 'near_identical': True, 'estimated': True, 'similarity': round(similarity, 4)},
+        'significant_added': [],
+        'significant_removed': []
+    }
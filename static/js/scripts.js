@@ -7,6 +7,7 @@ document.addEventListener('DOMContentLoaded', function () {
   const toggleChangesBtn = document.getElementById('toggleChangesBtn');
   const searchInput = document.getElementById('searchInput');
   const searchBtn = document.getElementById('searchBtn');
+  const searchResults = document.getElementById('searchResults');
   const keyAdditions = document.getElementById('keyAdditions');
   const keyRemovals = document.getElementById('keyRemovals');
   const diffInfo = document.getElementById('diffInfo');
@@ -24,6 +25,35 @@ document.addEventListener('DOMContentLoaded', function () {
   let currentDiffData = null;
   let showingOnlyChanges = false;
 
+  // Rows are fetched from the server a window at a time
+  const DIFF_PAGE_SIZE = 500;
+  let currentDiffId = null;
+  let currentStats = null;
+  let nextCursor = null;
+  let loadingMoreRows = null;
+
+  // When focusing on changes, only the changed rows are fetched, keyed by row index
+  let changeRows = new Map();
+  let changesCursor = null;
+
+  // Search hits are fetched from the server a window at a time
+  const SEARCH_PAGE_SIZE = 100;
+  const loadMoreSentinel = document.createElement('div');
+  loadMoreSentinel.className = 'load-more-sentinel';
+  loadMoreSentinel.setAttribute('aria-hidden', 'true');
+  diffContent.parentNode.parentNode.appendChild(loadMoreSentinel);
+  const loadMoreObserver = 'IntersectionObserver' in window
+    ? new IntersectionObserver(loadMoreRows, { root: null, rootMargin: '400px' })
+    : null;
+
+  // Word-level diffs are fetched lazily for changed rows as they scroll into view
+  const WORD_DIFF_BATCH_SIZE = 200;
+  let pendingWordDiffs = new Set();
+  let wordDiffTimer = null;
+  const wordDiffObserver = 'IntersectionObserver' in window
+    ? new IntersectionObserver(handleRowsVisible, { root: null, rootMargin: '200px' })
+    : null;
+
   // Initialize the custom date selectors
   const initDateSelectors = () => {
     // Get yesterday's date as the maximum allowed date
@@ -200,7 +230,7 @@ document.addEventListener('DOMContentLoaded', function () {
       toggleChangesBtn.classList.remove('active-toggle');
     }
 
-    renderDiffContent(currentDiffData);
+    showDiff();
   });
 
   // Handle search functionality
@@ -227,7 +257,7 @@ document.addEventListener('DOMContentLoaded', function () {
       headers: {
         'Content-Type': 'application/json'
       },
-      body: JSON.stringify({ url, timestamp })
+      body: JSON.stringify({ url, timestamp, page_size: loadMoreObserver ? DIFF_PAGE_SIZE : undefined })
     })
       .then(response => {
         if (!response.ok) {
@@ -248,8 +278,14 @@ document.addEventListener('DOMContentLoaded', function () {
           clearWarning();
         }
 
-        // Store the diff data
+        // Store the diff data and where the next window starts
         currentDiffData = data.diff_data;
+        currentDiffId = data.diff_id || null;
+        currentStats = data.stats;
+        nextCursor = data.next_cursor === undefined ? null : data.next_cursor;
+        changeRows = new Map();
+        changesCursor = null;
+        searchResults.classList.add('hidden');
 
         // Update headers with dates
         oldVersionHeader.textContent = `Archived Version (${data.archived_date})`;
@@ -292,7 +328,7 @@ document.addEventListener('DOMContentLoaded', function () {
         keyRemovals.innerHTML = data.significant_removed.map(item => `<li>${escapeHtml(item)}</li>`).join('');
 
         // Render diff content
-        renderDiffContent(data.diff_data);
+        showDiff();
 
         // Show results
         diffResults.classList.remove('hidden');
@@ -303,8 +339,40 @@ document.addEventListener('DOMContentLoaded', function () {
       });
   }
 
+  // Whether only the changed rows are being paged in from the server
+  function usingChangesWindow() {
+    return showingOnlyChanges && currentDiffId !== null;
+  }
+
+  // Render the current diff, fetching its changed rows first when focusing on changes
+  function showDiff() {
+    if (!usingChangesWindow()) {
+      renderDiffContent(currentDiffData);
+      return;
+    }
+
+    // Wait for a window of the other mode that is still loading
+    if (loadingMoreRows) {
+      loadingMoreRows.then(showDiff, showDiff);
+      return;
+    }
+
+    changeRows = new Map();
+    changesCursor = 0;
+    fetchNextWindow(false)
+      .then(data => {
+        if (data) renderDiffContent(data.diff_data, data.row_ids);
+      })
+      .catch(error => showError(error.message));
+  }
+
   // Function to render diff content
-  function renderDiffContent(diffData) {
+  function renderDiffContent(diffData, rowIds) {
+    // Stop paging until we know rows are being shown
+    if (loadMoreObserver) {
+      loadMoreObserver.unobserve(loadMoreSentinel);
+    }
+
     if (!diffData || !diffData.length) {
       // Create a full-width message
       const messageContainer = document.createElement('div');
@@ -320,8 +388,10 @@ document.addEventListener('DOMContentLoaded', function () {
       return;
     }
 
-    // Check if there are any changes (non-equal lines)
-    const hasChanges = diffData.some(item => item.type !== 'equal');
+    // Check if there are any changes (non-equal lines), including rows not loaded yet
+    const hasChanges = currentStats
+      ? currentStats.total_changes > 0
+      : diffData.some(item => item.type !== 'equal');
 
     // If showing only changes and there are none, display a message
     if (showingOnlyChanges && !hasChanges) {
@@ -359,9 +429,41 @@ document.addEventListener('DOMContentLoaded', function () {
 
     diffContent.innerHTML = '';
 
+    // Forget rows from any previous render
+    if (wordDiffObserver) {
+      wordDiffObserver.disconnect();
+    }
+    pendingWordDiffs = new Set();
+
+    const hasVisibleRows = appendDiffRows(diffData, 0, rowIds);
+
+    // If we filtered out all rows when showing only changes, display a message
+    if (!hasVisibleRows && showingOnlyChanges && currentCursor() === null) {
+      // Create a full-width message
+      diffContent.innerHTML = '';
+
+      const messageContainer = document.createElement('div');
+      messageContainer.className = 'full-width-message';
+
+      const messageElement = document.createElement('div');
+      messageElement.className = 'no-changes';
+      messageElement.textContent = 'No differences found between the versions';
+
+      messageContainer.appendChild(messageElement);
+      diffContent.appendChild(messageContainer);
+    }
+
+    observeLoadMore();
+  }
+
+  // Append rows for a window of diff items, returning whether any row was shown;
+  // rowIds gives each item's row index when the window is not contiguous
+  function appendDiffRows(items, startIndex, rowIds) {
     let hasVisibleRows = false;
 
-    diffData.forEach((item, index) => {
+    items.forEach((item, offset) => {
+      const index = rowIds ? rowIds[offset] : startIndex + offset;
+
       // Skip equal lines if showing only changes
       if (showingOnlyChanges && item.type === 'equal') {
         return;
@@ -372,6 +474,7 @@ document.addEventListener('DOMContentLoaded', function () {
       const row = document.createElement('div');
       row.className = 'diff-row';
       row.setAttribute('role', 'row');
+      row.dataset.index = index;
 
       const oldLineNum = document.createElement('div');
       oldLineNum.className = 'line-number';
@@ -406,27 +509,11 @@ document.addEventListener('DOMContentLoaded', function () {
         oldContent.textContent = item.old_text;
         newContent.textContent = item.new_text;
       } else if (item.type === 'change') {
-        // For changed lines, use word diff if available
-        if (item.word_diff && item.word_diff.length) {
-          let oldHtml = '';
-          let newHtml = '';
-
-          item.word_diff.forEach(wd => {
-            if (wd.type === 'equal') {
-              oldHtml += escapeHtml(wd.text);
-              newHtml += escapeHtml(wd.text);
-            } else if (wd.type === 'remove') {
-              oldHtml += `<span class="diff-remove">${escapeHtml(wd.text)}</span>`;
-            } else if (wd.type === 'add') {
-              newHtml += `<span class="diff-add">${escapeHtml(wd.text)}</span>`;
-            }
-          });
+        renderChangeContent(item, oldContent, newContent);
 
-          oldContent.innerHTML = oldHtml;
-          newContent.innerHTML = newHtml;
-        } else {
-          oldContent.innerHTML = `<span class="diff-remove">${escapeHtml(item.old_text)}</span>`;
-          newContent.innerHTML = `<span class="diff-add">${escapeHtml(item.new_text)}</span>`;
+        // Ask the server for the word diff once the row is actually on screen
+        if (item.word_diff === undefined && wordDiffObserver) {
+          wordDiffObserver.observe(row);
         }
       } else if (item.type === 'remove') {
         oldContent.innerHTML = `<span class="diff-remove">${escapeHtml(item.old_text)}</span>`;
@@ -442,20 +529,156 @@ document.addEventListener('DOMContentLoaded', function () {
       diffContent.appendChild(row);
     });
 
-    // If we filtered out all rows when showing only changes, display a message
-    if (!hasVisibleRows && showingOnlyChanges) {
-      // Create a full-width message
-      diffContent.innerHTML = '';
+    return hasVisibleRows;
+  }
 
-      const messageContainer = document.createElement('div');
-      messageContainer.className = 'full-width-message';
+  // Watch the end of the diff so the next window is fetched before it is needed
+  function observeLoadMore() {
+    if (!loadMoreObserver) return;
+    loadMoreObserver.unobserve(loadMoreSentinel);
+    if (currentDiffId && currentCursor() !== null) {
+      loadMoreObserver.observe(loadMoreSentinel);
+    }
+  }
 
-      const messageElement = document.createElement('div');
-      messageElement.className = 'no-changes';
-      messageElement.textContent = 'No differences found between the versions';
+  // Where the next window starts in the current mode, or null once everything is loaded
+  function currentCursor() {
+    return usingChangesWindow() ? changesCursor : nextCursor;
+  }
 
-      messageContainer.appendChild(messageElement);
-      diffContent.appendChild(messageContainer);
+  // Append the next window of rows to the diff as the end comes into view
+  function loadMoreRows(entries) {
+    if (!entries.some(entry => entry.isIntersecting) || loadingMoreRows || currentCursor() === null) return;
+
+    fetchNextWindow().catch(error => showError(error.message));
+  }
+
+  // Fetch the next window of all rows, or of changed rows when focusing on changes,
+  // from the server-side diff result and append it unless append is false; resolves
+  // to null if the diff or mode was replaced meanwhile
+  function fetchNextWindow(append = true) {
+    if (loadingMoreRows) return loadingMoreRows;
+
+    const diffId = currentDiffId;
+    const changesMode = usingChangesWindow();
+    const url = changesMode
+      ? `/diff/${diffId}/changes?cursor=${changesCursor}&limit=${DIFF_PAGE_SIZE}`
+      : `/diff/${diffId}/rows?cursor=${nextCursor}&limit=${DIFF_PAGE_SIZE}`;
+
+    loadingMoreRows = fetch(url)
+      .then(response => {
+        if (!response.ok) {
+          return response.json().then(data => {
+            throw new Error(data.error || 'Failed to load more rows');
+          });
+        }
+        return response.json();
+      })
+      .then(data => {
+        loadingMoreRows = null;
+        if (diffId !== currentDiffId || changesMode !== usingChangesWindow()) return null;
+
+        if (changesMode) {
+          data.row_ids.forEach((rowId, offset) => changeRows.set(rowId, data.diff_data[offset]));
+          changesCursor = data.next_cursor;
+        } else {
+          currentDiffData.push(...data.diff_data);
+          nextCursor = data.next_cursor;
+        }
+        if (append) {
+          appendDiffRows(data.diff_data, currentDiffData.length - data.diff_data.length, data.row_ids);
+          observeLoadMore();
+        }
+        return data;
+      }, error => {
+        loadingMoreRows = null;
+        throw error;
+      });
+    return loadingMoreRows;
+  }
+
+  // Function to render the two cells of a changed row
+  function renderChangeContent(item, oldContent, newContent) {
+    // For changed lines, use word diff if available
+    if (item.word_diff && item.word_diff.length) {
+      let oldHtml = '';
+      let newHtml = '';
+
+      item.word_diff.forEach(wd => {
+        if (wd.type === 'equal') {
+          oldHtml += escapeHtml(wd.text);
+          newHtml += escapeHtml(wd.text);
+        } else if (wd.type === 'remove') {
+          oldHtml += `<span class="diff-remove">${escapeHtml(wd.text)}</span>`;
+        } else if (wd.type === 'add') {
+          newHtml += `<span class="diff-add">${escapeHtml(wd.text)}</span>`;
+        }
+      });
+
+      oldContent.innerHTML = oldHtml;
+      newContent.innerHTML = newHtml;
+    } else {
+      oldContent.innerHTML = `<span class="diff-remove">${escapeHtml(item.old_text)}</span>`;
+      newContent.innerHTML = `<span class="diff-add">${escapeHtml(item.new_text)}</span>`;
+    }
+  }
+
+  // Queue word diffs for changed rows that scrolled into view
+  function handleRowsVisible(entries) {
+    entries.forEach(entry => {
+      if (entry.isIntersecting) {
+        pendingWordDiffs.add(parseInt(entry.target.dataset.index));
+        wordDiffObserver.unobserve(entry.target);
+      }
+    });
+
+    if (pendingWordDiffs.size && !wordDiffTimer) {
+      wordDiffTimer = setTimeout(loadPendingWordDiffs, 50);
+    }
+  }
+
+  // Fetch word diffs for the queued rows in batches
+  function loadPendingWordDiffs() {
+    wordDiffTimer = null;
+    const diffData = currentDiffData;
+    const indexes = Array.from(pendingWordDiffs).slice(0, WORD_DIFF_BATCH_SIZE);
+    indexes.forEach(index => pendingWordDiffs.delete(index));
+    if (!indexes.length || !diffData) return;
+
+    fetch('/word-diff', {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json'
+      },
+      body: JSON.stringify({
+        rows: indexes.map(index => {
+          const item = changeRows.get(index) || diffData[index];
+          return { old_text: item.old_text, new_text: item.new_text };
+        })
+      })
+    })
+      .then(response => response.ok ? response.json() : null)
+      .then(data => {
+        // Ignore responses for a diff that has since been replaced
+        if (!data || diffData !== currentDiffData) return;
+
+        indexes.forEach((index, position) => {
+          const item = changeRows.get(index) || diffData[index];
+          item.word_diff = data.word_diffs[position];
+
+          const row = diffContent.querySelector(`.diff-row[data-index="${index}"]`);
+          if (row) {
+            const contents = row.querySelectorAll('.content');
+            renderChangeContent(item, contents[0], contents[1]);
+          }
+        });
+      })
+      .catch(() => {
+        // Rows keep their line-level highlighting if the request fails
+      });
+
+    if (pendingWordDiffs.size) {
+      wordDiffTimer = setTimeout(loadPendingWordDiffs, 50);
     }
   }
 
@@ -463,6 +686,12 @@ document.addEventListener('DOMContentLoaded', function () {
   function searchInDiff(query) {
     if (!query || !currentDiffData) return;
 
+    // Search the whole diff on the server when it keeps the result, not just loaded rows
+    if (currentDiffId) {
+      searchOnServer(query);
+      return;
+    }
+
     // Remove existing highlights
     const highlights = document.querySelectorAll('.search-highlight');
     highlights.forEach(el => {
@@ -511,6 +740,78 @@ document.addEventListener('DOMContentLoaded', function () {
     }
   }
 
+  // Ask the server which rows match and list them with snippets
+  function searchOnServer(query) {
+    const diffId = currentDiffId;
+    const params = new URLSearchParams({
+      q: query,
+      changes_only: showingOnlyChanges ? '1' : '0',
+      limit: SEARCH_PAGE_SIZE
+    });
+
+    fetch(`/diff/${diffId}/search?${params}`)
+      .then(response => {
+        if (!response.ok) {
+          return response.json().then(data => {
+            throw new Error(data.error || 'Search failed');
+          });
+        }
+        return response.json();
+      })
+      .then(data => {
+        if (diffId !== currentDiffId) return;
+        renderSearchResults(data);
+      })
+      .catch(error => showError(error.message));
+  }
+
+  // List search hits; clicking one scrolls to its row, loading windows up to it if needed
+  function renderSearchResults(data) {
+    searchResults.innerHTML = '';
+    searchResults.classList.remove('hidden');
+
+    const summary = document.createElement('p');
+    summary.textContent = data.total_matches
+      ? `${data.total_matches} rows match "${data.query}"` + (data.next_cursor !== null ? `, showing the first ${data.matches.length}` : '')
+      : `No matches found for "${data.query}"`;
+    searchResults.appendChild(summary);
+
+    const list = document.createElement('ul');
+    data.matches.forEach(match => {
+      const snippet = match.new_snippet || match.old_snippet;
+      const item = document.createElement('li');
+      item.innerHTML = `<strong>Line ${match.line_num}</strong> (${match.type}): ` +
+        escapeHtml(snippet.text.slice(0, snippet.start)) +
+        `<span class="search-highlight">${escapeHtml(snippet.text.slice(snippet.start, snippet.end))}</span>` +
+        escapeHtml(snippet.text.slice(snippet.end));
+      item.addEventListener('click', () => scrollToRow(match.row_id));
+      list.appendChild(item);
+    });
+    searchResults.appendChild(list);
+
+    if (data.matches.length) {
+      scrollToRow(data.matches[0].row_id);
+    }
+  }
+
+  // Scroll a diff row into view, fetching windows until it has been loaded
+  function scrollToRow(rowId) {
+    const row = diffContent.querySelector(`.diff-row[data-index="${rowId}"]`);
+    if (row) {
+      diffContent.querySelectorAll('.scrolled-to').forEach(el => el.classList.remove('scrolled-to'));
+      row.classList.add('scrolled-to');
+      row.scrollIntoView({ behavior: 'smooth', block: 'center' });
+      return;
+    }
+    if (currentCursor() === null) return;
+
+    fetchNextWindow()
+      .then(data => {
+        if (data) scrollToRow(rowId);
+      })
+      .catch(error => showError(error.message));
+  }
+
   // Function to show warning message
   function showWarning(message) {
     // Check if warning element exists, if not create it
@@ -0,0 +1,25 @@
+from boilerplate import RepeatedLineIndex
+
+SHARED = ['Skip to content', 'Subscribe to our newsletter']
+
+
+def test_lines_repeated_across_pages_are_found():
+    index = RepeatedLineIndex(min_pages=3)
+    for i in range(3):
+        index.observe(f'https://example.com/page{i}', SHARED + [f'Body of page {i}'])
+    found = index.find('https://example.com/page9', SHARED + ['Old body'], SHARED + ['New body'])
+    assert found == set(SHARED)
+
+
+def test_query_string_variants_count_as_one_page():
+    index = RepeatedLineIndex(min_pages=3)
+    for query in ('', '?utm_source=mail', '?sort=new'):
+        index.observe(f'https://example.com/page{query}', SHARED)
+    assert index.find('https://example.com/other', SHARED, SHARED) == set()
+
+
+def test_only_lines_in_both_versions_are_found():
+    index = RepeatedLineIndex(min_pages=2)
+    for i in range(2):
+        index.observe(f'https://example.com/page{i}', SHARED)
+    assert index.find('https://example.com/page5', SHARED[:1], SHARED) == {SHARED[0]}
@@ -0,0 +1,19 @@
+from cache import TextCache
+
+
+def test_disk_tier_round_trip(tmp_path):
+    path = str(tmp_path / 'snapshots.sqlite3')
+    validators = {'etag': '"v1"', 'last_modified': 'Sat, 01 Jan 2022 00:00:00 GMT'}
+    TextCache(path).put('live|https://example.com', 'Hello', ttl=300, validators=validators)
+    TextCache(path).put('20220101|https://example.com', 'Hello')
+
+    # A fresh instance (another worker, or after a restart) reads both back from disk
+    cache = TextCache(path)
+    assert cache.lookup('live|https://example.com') == ('Hello', validators, True)
+    assert cache.get('20220101|https://example.com') == 'Hello'
+    assert cache.get('live|https://example.org') is None
+    stats = cache.get_stats()
+    assert (stats['disk_hits'], stats['misses'], stats['memory_entries']) == (2, 1, 2)
+
+    # Both keys share one stored body
+    assert cache._connect().execute('SELECT COUNT(*) FROM bodies').fetchone()[0] == 1
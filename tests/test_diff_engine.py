@@ -0,0 +1,83 @@
+import random
+import pytest
+import diff_pool
+from diff_engine import get_opcodes, DIFF_ENGINES
+
+
+def assert_valid_opcodes(opcodes, a, b):
+    # Opcodes must tile both sequences in order, and equal blocks must really match
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        assert i1 <= i2 and j1 <= j2
+        if tag == 'equal':
+            assert a[i1:i2] == b[j1:j2]
+        elif tag == 'delete':
+            assert i1 < i2 and j1 == j2
+        elif tag == 'insert':
+            assert i1 == i2 and j1 < j2
+        else:
+            assert tag == 'replace' and i1 < i2 and j1 < j2
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+
+
+def matched_lines(opcodes):
+    return sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == 'equal')
+
+
+def lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def random_pairs(count, seed=7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        a = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+        b = [rng.choice('abcde') for _ in range(rng.randint(0, 30))]
+        yield a, b
+
+
+@pytest.mark.parametrize('engine', DIFF_ENGINES)
+def test_opcodes_cover_both_sequences(engine):
+    for a, b in random_pairs(200):
+        assert_valid_opcodes(get_opcodes(a, b, engine), a, b)
+
+
+def test_myers_finds_a_longest_common_subsequence():
+    for a, b in random_pairs(200):
+        assert matched_lines(get_opcodes(a, b, 'myers')) == lcs_length(a, b)
+
+
+@pytest.mark.parametrize('engine', DIFF_ENGINES)
+@pytest.mark.parametrize('a, b', [([], []), ([], ['x', 'y']), (['x', 'y'], []), (['x', 'y', 'x'], ['x', 'y', 'x'])])
+def test_empty_and_identical_inputs(engine, a, b):
+    opcodes = get_opcodes(a, b, engine)
+    assert_valid_opcodes(opcodes, a, b)
+    if a == b:
+        assert all(tag == 'equal' for tag, *_ in opcodes)
+
+
+def test_chunked_opcodes_are_valid(monkeypatch):
+    monkeypatch.setattr(diff_pool, 'DIFF_POOL_WORKERS', 2)
+    monkeypatch.setattr(diff_pool, '_executor', None)
+    monkeypatch.setattr(diff_pool, 'DIFF_CHUNK_THRESHOLD', 100)
+    monkeypatch.setattr(diff_pool, 'DIFF_CHUNK_LINES', 40)
+    rng = random.Random(11)
+    # Mostly unique lines, so there are anchors to split at, with some repeated ones mixed in
+    a = [f'line {n}' if rng.random() < 0.8 else 'repeated' for n in range(600)]
+    b = [line for line in a if rng.random() < 0.9]
+    b[100:100] = ['new line', 'repeated']
+    try:
+        assert len(diff_pool.split_at_anchors(*diff_pool.intern_lines(a, b), 40)) > 1
+        for engine in DIFF_ENGINES:
+            opcodes = diff_pool.compute_opcodes(a, b, engine)
+            assert_valid_opcodes(opcodes, a, b)
+            assert any(tag != 'equal' for tag, *_ in opcodes)
+    finally:
+        diff_pool.get_executor().shutdown()
@@ -0,0 +1,21 @@
+import pytest
+from diff_engine import get_opcodes
+from diff_generator import create_diff_data, iter_diff_data, stream_diff_content, generate_diff_content
+
+ARCHIVED = ['Home', 'Intro', 'Old pricing: $10', 'Details', 'Removed note', 'Contact', 'Footer']
+CURRENT = ['Home', 'Intro', 'New pricing: $12', 'Details', 'Contact', 'Added line', 'Footer']
+
+
+@pytest.mark.parametrize('word_diff', [False, True])
+def test_streamed_rows_match_stored_rows(word_diff):
+    opcodes = get_opcodes(ARCHIVED, CURRENT)
+    assert list(iter_diff_data(opcodes, ARCHIVED, CURRENT, word_diff)) == list(create_diff_data(opcodes, ARCHIVED, CURRENT, word_diff))
+
+
+def test_stream_matches_full_result():
+    current_text, archived_text = '\n'.join(CURRENT), '\n'.join(ARCHIVED)
+    records = list(stream_diff_content(current_text, archived_text, 'https://example.com', '20220101'))
+    full = generate_diff_content(current_text, archived_text, 'https://example.com', '20220101')
+    rows = [{key: value for key, value in record.items() if key != 'record'} for record in records if record['record'] == 'row']
+    assert rows == list(full['diff_data'])
+    assert records[-1]['stats'] == full['stats']
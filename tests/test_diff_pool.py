@@ -0,0 +1,47 @@
+import os
+import signal
+import time
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+import diff_pool
+from diff_engine import get_opcodes
+
+ARCHIVED = ['a', 'b', 'c']
+CURRENT = ['a', 'x', 'c']
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(diff_pool, 'DIFF_POOL_WORKERS', 2)
+    monkeypatch.setattr(diff_pool, '_executor', None)
+    yield diff_pool.get_executor()
+    diff_pool.get_executor().shutdown()
+
+
+def kill_workers(executor):
+    while not executor._processes:
+        time.sleep(0.01)
+    for pid in list(executor._processes):
+        os.kill(pid, signal.SIGKILL)
+
+
+def test_call_in_flight_when_worker_dies_runs_in_process(pool, capsys):
+    future = diff_pool.submit(time.sleep, 0.5)
+    kill_workers(pool)
+
+    assert diff_pool.get_result(future, get_opcodes, ARCHIVED, CURRENT) == get_opcodes(ARCHIVED, CURRENT)
+    assert diff_pool.get_executor() is not pool
+    assert 'restarting the pool' in capsys.readouterr().out
+    assert diff_pool.compute_opcodes(ARCHIVED, CURRENT) == get_opcodes(ARCHIVED, CURRENT)
+
+
+def test_submit_replaces_broken_pool(pool, capsys):
+    # Break the pool behind diff_pool's back so only submit can notice
+    future = pool.submit(time.sleep, 0.5)
+    kill_workers(pool)
+    with pytest.raises(BrokenProcessPool):
+        future.result()
+
+    assert diff_pool.submit(get_opcodes, ARCHIVED, CURRENT).result() == get_opcodes(ARCHIVED, CURRENT)
+    assert diff_pool.get_executor() is not pool
+    assert 'restarting the pool' in capsys.readouterr().out
@@ -0,0 +1,74 @@
+import os
+import glob
+import pytest
+from bs4 import BeautifulSoup
+from text_extractor import BACKENDS, NO_RULES, create_rules, extract_text, get_backend_name
+from utils import extract_meaningful_content
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURES = sorted(glob.glob(os.path.join(FIXTURE_DIR, '*.html')))
+AVAILABLE_BACKENDS = [name for name, extractor_class in BACKENDS.items() if extractor_class is not None]
+
+
+def read_fixture(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_matches_beautifulsoup_on_fixtures(path, backend):
+    # Without boilerplate rules every backend must diff exactly like the original BeautifulSoup path
+    html = read_fixture(path)
+    expected = extract_meaningful_content(BeautifulSoup(html, 'html.parser').get_text())
+    assert extract_meaningful_content(extract_text(html, backend, NO_RULES)) == expected
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+@pytest.mark.parametrize('html', [
+    '<p>x<![CDATA[cd]]>y</p>',
+    '<svg><![CDATA[s]]></svg>',
+    '<p>b</p>    <textarea>t\nx</textarea>',
+    '<p>a</p><textarea>\nq</textarea>',
+    '<div>b</div>\n<pre>\nt\nx</pre>',
+    '<pre>   </pre><p>a</p>  <p>b</p>'
+])
+def test_matches_beautifulsoup_text_nodes(html, backend):
+    assert extract_text(html, backend, NO_RULES) == BeautifulSoup(html, 'html.parser').get_text()
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_excluded_region_ends_at_implied_end_tag(backend):
+    html = '<ul><li class=ad>Ad\n<li>Real item</ul>\n<p class=cookie>We use cookies\n<p>Main article text'
+    text = extract_text(html, backend, create_rules(exclude='.ad,.cookie'))
+    assert extract_meaningful_content(text) == 'Real item\nMain article text'
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_default_rules_keep_article_headers(backend):
+    html = read_fixture(os.path.join(FIXTURE_DIR, 'article.html'))
+    text = extract_meaningful_content(extract_text(html, backend, create_rules(exclude='nav,header,footer,aside')))
+    assert 'Fed raises rates' in text
+    assert 'Updated 14:05' in text
+    assert 'The Daily Example' not in text
+    assert 'Inflation cools' not in text
+
+
+@pytest.mark.parametrize('backend', AVAILABLE_BACKENDS)
+def test_nested_include_matches_are_extracted_once(backend):
+    html = '<div>outer <div>inner</div> tail</div><p>skipped</p>'
+    assert extract_text(html, backend, create_rules(include='div')) == 'outer inner tail\n'
+
+
+@pytest.mark.parametrize('path', FIXTURES, ids=os.path.basename)
+def test_backends_agree_with_default_rules(path):
+    html = read_fixture(path)
+    texts = {backend: extract_meaningful_content(extract_text(html, backend)) for backend in AVAILABLE_BACKENDS}
+    assert len(set(texts.values())) == 1, texts
+
+
+def test_auto_prefers_selectolax_with_rules():
+    if BACKENDS['selectolax'] is None:
+        pytest.skip('selectolax is not installed')
+    assert get_backend_name('auto', create_rules(exclude='nav')) == 'selectolax'
+    assert get_backend_name('auto', NO_RULES) == AVAILABLE_BACKENDS[0]
@@ -0,0 +1,133 @@
+import threading
+import time
+import pytest
+import web_fetcher
+from cache import TextCache
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=b'', headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+        self._body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self._body), chunk_size):
+            yield self._body[start:start + chunk_size]
+
+
+class FakeSession:
+    """Answers with the queued responses in order and records the request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def get(self, url, headers=None, **kwargs):
+        self.requests.append(headers or {})
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    fake = FakeSession()
+    monkeypatch.setattr(web_fetcher, 'get_session', lambda: fake)
+    monkeypatch.setattr(web_fetcher, 'snapshot_cache', TextCache())
+    return fake
+
+
+def wait_for_followers(before, followers):
+    while web_fetcher.get_single_flight_stats()['deduplicated'] < before + followers:
+        time.sleep(0.01)
+
+
+def test_single_flight_runs_one_fetch_for_concurrent_callers():
+    release = threading.Event()
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        release.wait(5)
+        return 'text'
+
+    before = web_fetcher.get_single_flight_stats()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(web_fetcher.single_flight('shared', fetch))) for _ in range(5)]
+    threads[0].start()
+    while not calls:
+        time.sleep(0.01)
+    for thread in threads[1:]:
+        thread.start()
+    wait_for_followers(before['deduplicated'], 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    after = web_fetcher.get_single_flight_stats()
+    assert results == ['text'] * 5
+    assert len(calls) == 1
+    assert after['fetches'] - before['fetches'] == 1
+    assert after['deduplicated'] - before['deduplicated'] == 4
+    assert after['in_flight'] == 0
+
+
+def test_single_flight_leader_exception_reaches_followers():
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise RuntimeError('origin down')
+
+    errors = []
+
+    def call():
+        try:
+            web_fetcher.single_flight('failing', fetch)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    before = web_fetcher.get_single_flight_stats()['deduplicated']
+    leader = threading.Thread(target=call)
+    leader.start()
+    while web_fetcher.get_single_flight_stats()['in_flight'] == 0:
+        time.sleep(0.01)
+    followers = [threading.Thread(target=call) for _ in range(2)]
+    for thread in followers:
+        thread.start()
+    wait_for_followers(before, 2)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert errors == ['origin down'] * 3
+    assert web_fetcher.get_single_flight_stats()['in_flight'] == 0
+
+
+def test_not_modified_reuses_cached_text_and_refreshes_ttl(session, monkeypatch):
+    url = 'https://example.com/page'
+    session.responses = [
+        FakeResponse(200, b'<p>Hello</p>', {'ETag': '"v1"', 'Content-Type': 'text/html; charset=utf-8'}),
+        FakeResponse(304)
+    ]
+    # Store the first copy already expired, so the next call has to revalidate it
+    monkeypatch.setattr(web_fetcher, 'LIVE_TTL', -1)
+    assert web_fetcher.get_page_text(url) == 'Hello'
+
+    monkeypatch.setattr(web_fetcher, 'LIVE_TTL', 300)
+    assert web_fetcher.get_page_text(url) == 'Hello'
+    assert session.requests[1] == {'If-None-Match': '"v1"'}
+    assert web_fetcher.snapshot_cache.get_stats()['revalidated'] == 1
+
+    # The refreshed entry is served without another request
+    assert web_fetcher.get_page_text(url) == 'Hello'
+    assert len(session.requests) == 2
@@ -0,0 +1,575 @@
+import os
+import re
+from html.parser import HTMLParser
+from utils import get_hash
+
+try:
+    from lxml import etree as lxml_etree
+except ImportError:
+    lxml_etree = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser
+    except ImportError:
+        SelectolaxParser = None
+
+# Preferred backend: 'auto', 'lxml', 'selectolax' or 'stdlib'
+HTML_BACKEND = os.environ.get('HTML_BACKEND', 'auto')
+
+# Elements whose contents never show up in the extracted text
+SKIPPED_TAGS = frozenset(['script', 'style', 'template'])
+
+# Elements whose whitespace-only strings are kept verbatim
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+# HTML5 parsers drop the newline right after these start tags, BeautifulSoup keeps it
+LEADING_NEWLINE_PATTERN = re.compile(r'(<(?:pre|textarea)\b[^>]*>)(?=\r?\n)', re.IGNORECASE)
+
+# Elements that never have an end tag, so they cannot start an excluded or included region
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'
+])
+
+# Start tags that close the nearest open element of the first set (whose end tag
+# may be omitted), unless an element of the second set is found first
+IMPLIED_END_TAGS = {
+    'li': (frozenset(['li']), frozenset(['ul', 'ol', 'menu', 'table'])),
+    'dt': (frozenset(['dt', 'dd']), frozenset(['dl', 'table'])),
+    'dd': (frozenset(['dt', 'dd']), frozenset(['dl', 'table'])),
+    'tr': (frozenset(['tr']), frozenset(['table', 'thead', 'tbody', 'tfoot'])),
+    'td': (frozenset(['td', 'th']), frozenset(['tr', 'table'])),
+    'th': (frozenset(['td', 'th']), frozenset(['tr', 'table'])),
+    'thead': (frozenset(['thead', 'tbody', 'tfoot']), frozenset(['table'])),
+    'tbody': (frozenset(['thead', 'tbody', 'tfoot']), frozenset(['table'])),
+    'tfoot': (frozenset(['thead', 'tbody', 'tfoot']), frozenset(['table'])),
+    'option': (frozenset(['option']), frozenset(['select', 'datalist', 'optgroup'])),
+    'optgroup': (frozenset(['optgroup']), frozenset(['select']))
+}
+
+# Start tags that close an open <p>, and the elements a <p> cannot be closed across
+P_CLOSING_TAGS = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'dd', 'details', 'div', 'dl', 'dt', 'fieldset', 'figcaption',
+    'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hgroup', 'li', 'main', 'menu',
+    'nav', 'ol', 'p', 'pre', 'section', 'table', 'ul'
+])
+P_SCOPE_BOUNDARIES = frozenset(['button', 'table', 'td', 'th', 'caption', 'template', 'object'])
+
+# Everything a start tag closes, looked up once per tag
+START_TAG_CLOSES = {
+    tag: tuple(
+        ([IMPLIED_END_TAGS[tag]] if tag in IMPLIED_END_TAGS else [])
+        + ([(frozenset(['p']), P_SCOPE_BOUNDARIES)] if tag in P_CLOSING_TAGS else [])
+    )
+    for tag in set(IMPLIED_END_TAGS) | P_CLOSING_TAGS
+}
+
+# Plain header/footer selectors only match page-level landmarks: as with ARIA's
+# banner and contentinfo roles, not those inside sectioning content
+LANDMARK_TAGS = frozenset(['header', 'footer'])
+SECTIONING_TAGS = frozenset(['article', 'aside', 'main', 'nav', 'section'])
+
+# Default boilerplate rules: comma-separated selectors, overridable through the environment
+BOILERPLATE_EXCLUDE = os.environ.get('BOILERPLATE_EXCLUDE', 'nav,header,footer,aside')
+BOILERPLATE_INCLUDE = os.environ.get('BOILERPLATE_INCLUDE', '')
+
+# One compound selector: an optional tag followed by #id, .class and [attr] / [attr=value] parts
+SELECTOR_PATTERN = re.compile(r'^([a-z][a-z0-9-]*|\*)?((?:#[\w-]+|\.[\w-]+|\[[\w-]+(?:=(?:"[^"]*"|\'[^\']*\'|[^\]]*))?\])*)$')
+SELECTOR_PART_PATTERN = re.compile(r'#([\w-]+)|\.([\w-]+)|\[([\w-]+)(?:=("[^"]*"|\'[^\']*\'|[^\]]*))?\]')
+
+
+def parse_selector(selector):
+    """
+    Parses a compound CSS selector such as 'div.cookie-banner' or '[role=navigation]'.
+
+    Combinators and pseudo-classes are not supported, since the streaming
+    extractors only see one start tag at a time.
+
+    Returns:
+        tuple: (tag, element_id, classes, attributes); tag is None for any element
+
+    Raises:
+        ValueError: If the selector uses unsupported syntax
+    """
+    selector = selector.strip().lower()
+    match = SELECTOR_PATTERN.match(selector)
+    if not selector or not match:
+        raise ValueError(f"Unsupported selector: '{selector}'")
+    tag = match.group(1) if match.group(1) != '*' else None
+    element_id = None
+    classes = set()
+    attributes = []
+    for id_part, class_part, attribute, value in SELECTOR_PART_PATTERN.findall(match.group(2)):
+        if id_part:
+            element_id = id_part
+        elif class_part:
+            classes.add(class_part)
+        else:
+            attributes.append((attribute, value.strip('"\'') if value else None))
+    return tag, element_id, frozenset(classes), tuple(attributes)
+
+
+def selector_matches(selector, tag, attrs):
+    """Checks a parsed selector against a start tag and its attribute dict."""
+    selector_tag, element_id, classes, attributes = selector
+    if selector_tag is not None and selector_tag != tag:
+        return False
+    if element_id is not None and (attrs.get('id') or '').lower() != element_id:
+        return False
+    if classes and not classes.issubset((attrs.get('class') or '').lower().split()):
+        return False
+    for name, value in attributes:
+        if name not in attrs or (value is not None and (attrs[name] or '').lower() != value):
+            return False
+    return True
+
+
+class ExtractionRules:
+    """
+    Include and exclude selectors applied while extracting text.
+
+    Text inside an element matching an exclude selector is dropped. When
+    include selectors are given, only text inside matching elements is kept,
+    unless none of them match, in which case the whole page is used. A plain
+    'header' or 'footer' selector leaves out the headers and footers of
+    articles and sections (see LANDMARK_TAGS); 'article header' style
+    combinators are not supported, but 'header.byline' matches anywhere.
+    """
+
+    def __init__(self, include=(), exclude=()):
+        self.include = tuple(selector.strip() for selector in include if selector.strip())
+        self.exclude = tuple(selector.strip() for selector in exclude if selector.strip())
+        # Plain tag selectors are checked with a set lookup; the rest need the attributes
+        self._include_tags, self._include = self._compile(self.include)
+        self._exclude_tags, self._exclude = self._compile(self.exclude)
+        # Tags that can match an exclude selector, or None when any tag can
+        self.exclude_candidates = None if self._exclude else self._exclude_tags
+        # Part of the cache key, since different rules extract different text
+        self.fingerprint = get_hash(f"{self.include}|{self.exclude}")[:12] if self else 'all'
+
+    def __bool__(self):
+        return bool(self.include or self.exclude)
+
+    def includes(self, tag, attrs):
+        return tag in self._include_tags or self._matches(self._include, tag, attrs)
+
+    def excludes(self, tag, attrs, in_section=False):
+        if tag in self._exclude_tags and not (in_section and tag in LANDMARK_TAGS):
+            return True
+        return self._matches(self._exclude, tag, attrs)
+
+    @staticmethod
+    def _compile(selectors):
+        tags = set()
+        compound = []
+        for selector in map(parse_selector, selectors):
+            if selector[0] is not None and not any(selector[1:]):
+                tags.add(selector[0])
+            else:
+                compound.append(selector)
+        return frozenset(tags), compound
+
+    @staticmethod
+    def _matches(selectors, tag, attrs):
+        if not selectors or not attrs:
+            return False
+        attrs = dict(attrs)
+        return any(selector_matches(selector, tag, attrs) for selector in selectors)
+
+
+def split_selectors(value):
+    """Splits a comma-separated selector list (or passes a list through)."""
+    if isinstance(value, str):
+        return [selector for selector in value.split(',') if selector.strip()]
+    return [str(selector) for selector in value or []]
+
+
+def create_rules(include=None, exclude=None):
+    """Builds extraction rules, using the BOILERPLATE_* defaults for anything not given."""
+    return ExtractionRules(
+        split_selectors(BOILERPLATE_INCLUDE if include is None else include),
+        split_selectors(BOILERPLATE_EXCLUDE if exclude is None else exclude)
+    )
+
+
+DEFAULT_RULES = create_rules()
+NO_RULES = ExtractionRules()
+
+
+class RegionTracker:
+    """
+    Follows start and end tags to know whether the parser is inside an
+    excluded or included element.
+
+    Keeps the stack of open elements, closing them the way browsers do: an
+    end tag closes everything opened after its element, and start tags such
+    as <li> or <p> end an open sibling whose end tag was omitted (the stdlib
+    tokenizer never reports those implied end tags). A region is the stack
+    depth of the element that opened it and ends once the stack shrinks
+    below that depth. Parsers that report implied end tags themselves pass
+    implied_ends=False to skip that bookkeeping.
+    """
+
+    def __init__(self, rules, implied_ends=True):
+        self.rules = rules
+        self._implied_ends = implied_ends
+        self.excluded = None
+        self.included = None
+        self._stack = []
+        # This runs for every start tag, so skip include checks when there are no include rules
+        self._has_include = bool(rules.include)
+        self._exclude_candidates = rules.exclude_candidates
+
+    def start(self, tag, attrs):
+        """Returns True when the start tag implicitly closes an included region."""
+        if tag in VOID_TAGS:
+            return False
+        closed = False
+        stack = self._stack
+        if self._implied_ends and tag in START_TAG_CLOSES and stack:
+            for tags, boundaries in START_TAG_CLOSES[tag]:
+                closed = self._close_open(tags, boundaries) or closed
+
+        # Nothing inside an excluded region can open another one
+        if self.excluded is None:
+            candidates = self._exclude_candidates
+            if (candidates is None or tag in candidates) and self.rules.excludes(tag, attrs, tag in LANDMARK_TAGS and self.in_section()):
+                self.excluded = len(stack) + 1
+            elif self.included is None and self._has_include and self.rules.includes(tag, attrs):
+                self.included = len(stack) + 1
+        stack.append(tag)
+        return closed
+
+    def end(self, tag):
+        """Returns True when the end tag closes an included region."""
+        if tag in VOID_TAGS:
+            return False
+        stack = self._stack
+        # Usually the end tag closes the innermost element, outside any region
+        if stack and stack[-1] == tag:
+            stack.pop()
+            if self.excluded is None and self.included is None:
+                return False
+            return self._pop_to(len(stack))
+        for index in range(len(stack) - 2, -1, -1):
+            if stack[index] == tag:
+                return self._pop_to(index)
+        # Stray end tags close nothing
+        return False
+
+    def in_section(self):
+        """Whether an element opened now is inside sectioning content."""
+        return not SECTIONING_TAGS.isdisjoint(self._stack)
+
+    def _close_open(self, tags, boundaries):
+        stack = self._stack
+        for index in range(len(stack) - 1, -1, -1):
+            if stack[index] in tags:
+                return self._pop_to(index)
+            if stack[index] in boundaries:
+                break
+        return False
+
+    def _pop_to(self, index):
+        del self._stack[index:]
+        if self.excluded is not None and self.excluded > index:
+            self.excluded = None
+        if self.included is not None and self.included > index:
+            self.included = None
+            return True
+        return False
+
+
+def collapse_whitespace_node(data, preserve):
+    """Collapses a whitespace-only text node the way BeautifulSoup does."""
+    if not preserve and not data.strip(ASCII_SPACES):
+        return '\n' if '\n' in data else ' '
+    return data
+
+
+class StreamingTextExtractor(HTMLParser):
+    """
+    Incremental HTML-to-text extractor.
+
+    Feeds markup through the stdlib tokenizer without building a DOM and
+    collects text outside of <script>, <style> and <template>, matching
+    what BeautifulSoup's get_text() returns for the same document. Extraction
+    rules drop boilerplate regions while the document streams through.
+    """
+
+    def __init__(self, rules=None):
+        super().__init__(convert_charrefs=True)
+        self._parts = []
+        self._included_parts = []
+        self._pending = []
+        self._skip_depth = 0
+        self._preserve_depth = 0
+        rules = DEFAULT_RULES if rules is None else rules
+        self._regions = RegionTracker(rules) if rules else None
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        if self._regions is not None and self._regions.start(tag, attrs):
+            self._included_parts.append('\n')
+
+    def handle_startendtag(self, tag, attrs):
+        # Self-closing tags never wrap any text
+        self._flush()
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in PRESERVE_WHITESPACE_TAGS and self._preserve_depth:
+            self._preserve_depth -= 1
+        if self._regions is not None and self._regions.end(tag):
+            self._included_parts.append('\n')
+
+    def handle_data(self, data):
+        if not self._skip_depth and (self._regions is None or self._regions.excluded is None):
+            self._pending.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def handle_decl(self, decl):
+        self._flush()
+
+    def handle_pi(self, data):
+        self._flush()
+
+    def unknown_decl(self, data):
+        self._flush()
+        # BeautifulSoup keeps CDATA sections as text
+        if data.startswith('CDATA[') and not self._skip_depth and (self._regions is None or self._regions.excluded is None):
+            self._parts.append(data[6:])
+            if self._regions is not None and self._regions.included is not None:
+                self._included_parts.append(data[6:])
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def get_text(self):
+        """Returns the text collected so far, limited to the included regions if any matched."""
+        return ''.join(self._included_parts or self._parts)
+
+    def _flush(self):
+        """Emits the pending text node, collapsing whitespace-only strings like BeautifulSoup."""
+        if not self._pending:
+            return
+        data = collapse_whitespace_node(''.join(self._pending), self._preserve_depth)
+        self._pending = []
+        self._parts.append(data)
+        if self._regions is not None and self._regions.included is not None:
+            self._included_parts.append(data)
+
+
+class LxmlTextExtractor:
+    """
+    Incremental extractor backed by libxml2's HTML parser.
+
+    Uses lxml's parser-target interface, so text events are collected as
+    chunks are fed without building an element tree.
+    """
+
+    def __init__(self, rules=None):
+        self._parts = []
+        self._included_parts = []
+        self._pending = []
+        self._skip_depth = 0
+        self._preserve_depth = 0
+        rules = DEFAULT_RULES if rules is None else rules
+        # libxml2 reports the end tags it implies, like a DOM builder would need
+        self._regions = RegionTracker(rules, implied_ends=False) if rules else None
+        self._parser = lxml_etree.HTMLParser(target=self)
+
+    def feed(self, data):
+        self._parser.feed(data)
+
+    def close(self):
+        try:
+            self._parser.close()
+        except lxml_etree.XMLSyntaxError:
+            # Raised for empty documents, which simply have no text
+            pass
+        self._flush()
+
+    def get_text(self):
+        """Returns the text collected so far, limited to the included regions if any matched."""
+        return ''.join(self._included_parts or self._parts)
+
+    # Parser target callbacks
+
+    def start(self, tag, attrib):
+        self._flush()
+        if tag in SKIPPED_TAGS:
+            self._skip_depth += 1
+        elif tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_depth += 1
+        if self._regions is not None and self._regions.start(tag, attrib):
+            self._included_parts.append('\n')
+
+    def end(self, tag):
+        self._flush()
+        if tag in SKIPPED_TAGS and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in PRESERVE_WHITESPACE_TAGS and self._preserve_depth:
+            self._preserve_depth -= 1
+        if self._regions is not None and self._regions.end(tag):
+            self._included_parts.append('\n')
+
+    def data(self, data):
+        if not self._skip_depth and (self._regions is None or self._regions.excluded is None):
+            self._pending.append(data)
+
+    def comment(self, text):
+        self._flush()
+        # libxml2 reports CDATA sections as comments; BeautifulSoup keeps them as text
+        if text.startswith('[CDATA[') and text.endswith(']]') and not self._skip_depth \
+                and (self._regions is None or self._regions.excluded is None):
+            self._parts.append(text[7:-2])
+            if self._regions is not None and self._regions.included is not None:
+                self._included_parts.append(text[7:-2])
+
+    def _flush(self):
+        if not self._pending:
+            return
+        data = collapse_whitespace_node(''.join(self._pending), self._preserve_depth)
+        self._pending = []
+        self._parts.append(data)
+        if self._regions is not None and self._regions.included is not None:
+            self._included_parts.append(data)
+
+
+class SelectolaxTextExtractor:
+    """
+    Extractor backed by selectolax's C parser.
+
+    selectolax cannot parse incrementally, so chunks are buffered and the
+    document is parsed in one go on close(). Extraction rules are applied
+    with selectolax's own CSS engine.
+    """
+
+    def __init__(self, rules=None):
+        self._chunks = []
+        self._text = ''
+        self._rules = DEFAULT_RULES if rules is None else rules
+
+    def feed(self, data):
+        self._chunks.append(data)
+
+    def close(self):
+        html = ''.join(self._chunks)
+        self._chunks = []
+        if not html.strip():
+            return
+        tree = SelectolaxParser(LEADING_NEWLINE_PATTERN.sub('\\1\n', html))
+        tree.strip_tags(list(SKIPPED_TAGS))
+        for selector in self._rules.exclude:
+            landmark = selector.lower() in LANDMARK_TAGS
+            for node in tree.css(selector):
+                if not (landmark and has_ancestor(node, SECTIONING_TAGS)):
+                    node.decompose()
+        if tree.root is None:
+            return
+        included = outermost(tree.css(', '.join(self._rules.include))) if self._rules.include else []
+        if included:
+            self._text = '\n'.join(node_text(node) for node in included) + '\n'
+        else:
+            self._text = node_text(tree.root)
+
+    def get_text(self):
+        """Returns the extracted text; empty until close() is called."""
+        return self._text
+
+
+def outermost(nodes):
+    """Drops selectolax nodes nested inside another of the nodes, keeping document order."""
+    matched = {node.mem_id for node in nodes}
+    kept = []
+    for node in nodes:
+        parent = node.parent
+        while parent is not None and parent.mem_id not in matched:
+            parent = parent.parent
+        if parent is None:
+            kept.append(node)
+    return kept
+
+
+def has_ancestor(node, tags):
+    """Whether a selectolax node is inside an element with one of the given tags."""
+    parent = node.parent
+    while parent is not None:
+        if parent.tag in tags:
+            return True
+        parent = parent.parent
+    return False
+
+
+def node_text(root):
+    """Joins the text under a selectolax node the way BeautifulSoup's get_text() does."""
+    parts = []
+    for node in root.traverse(include_text=True):
+        tag = node.tag
+        if tag == '-text':
+            data = node.text_content
+            if not data.strip(ASCII_SPACES):
+                data = collapse_whitespace_node(data, has_ancestor(node, PRESERVE_WHITESPACE_TAGS))
+            parts.append(data)
+        elif tag == '-comment':
+            # HTML5 parsers turn CDATA sections outside SVG and MathML into comments
+            markup = node.html
+            if markup.startswith('<!--[CDATA[') and markup.endswith(']]-->'):
+                parts.append(markup[11:-5])
+    return ''.join(parts)
+
+
+# Backends in order of preference for 'auto'
+BACKENDS = {
+    'lxml': LxmlTextExtractor if lxml_etree is not None else None,
+    'selectolax': SelectolaxTextExtractor if SelectolaxParser is not None else None,
+    'stdlib': StreamingTextExtractor
+}
+
+
+def get_backend_name(backend=None, rules=None):
+    """
+    Resolves the requested backend to an installed one, falling back to the stdlib parser.
+
+    With extraction rules, 'auto' prefers selectolax: its CSS engine applies
+    them at no extra cost, while the streaming backends track regions tag by tag.
+    """
+    backend = backend or HTML_BACKEND
+    if backend != 'auto':
+        if BACKENDS.get(backend) is not None:
+            return backend
+        print(f"HTML backend '{backend}' is not available, falling back")
+    elif rules and BACKENDS['selectolax'] is not None:
+        return 'selectolax'
+    for name, extractor_class in BACKENDS.items():
+        if extractor_class is not None:
+            return name
+    return 'stdlib'
+
+
+def create_extractor(backend=None, rules=None):
+    """Creates a text extractor for the requested (or best installed) backend; rules default to DEFAULT_RULES."""
+    rules = DEFAULT_RULES if rules is None else rules
+    return BACKENDS[get_backend_name(backend, rules)](rules)
+
+
+def extract_text(html, backend=None, rules=None):
+    """Extracts the visible text from a complete HTML string."""
+    extractor = create_extractor(backend, rules)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.get_text()
@@ -0,0 +1,139 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
+from web_fetcher import get_page_text, get_wayback_snapshot, parse_wayback_url
+from utils import extract_meaningful_content, get_hash
+from boilerplate import clean_pair
+from comparison import FETCH_DEADLINE, diff_pool_capacity
+from batch import diff_stats
+from cache import interval_results
+from diff_engine import DIFF_ENGINE
+import diff_pool
+import metrics
+
+# Timeline settings, overridable through the environment
+TIMELINE_MAX_SNAPSHOTS = int(os.environ.get('TIMELINE_MAX_SNAPSHOTS', 20))
+TIMELINE_FETCH_WORKERS = int(os.environ.get('TIMELINE_FETCH_WORKERS', 4))
+
+# Timelines fetch up to TIMELINE_MAX_SNAPSHOTS + 1 pages, so they get their own pool
+# rather than crowding out /generate-diff on the shared fetch pool
+timeline_executor = ThreadPoolExecutor(max_workers=TIMELINE_FETCH_WORKERS)
+
+def fetch_point(url, timestamp, rules=None):
+    """
+    Fetches and cleans one point of a timeline.
+
+    Args:
+        url (str): The live URL
+        timestamp (str): A validated YYYYMMDD timestamp, or None for the live page
+        rules (ExtractionRules): Optional boilerplate rules for text extraction
+
+    Returns:
+        dict: The point's capture details, its extracted text and the hash of its cleaned text
+    """
+    if timestamp is None:
+        point = {'timestamp': 'current', 'capture_timestamp': None, 'snapshot_url': url}
+    else:
+        snapshot_url = get_wayback_snapshot(url, timestamp)
+        wayback = parse_wayback_url(snapshot_url)
+        point = {'timestamp': timestamp, 'capture_timestamp': wayback[0] if wayback else timestamp, 'snapshot_url': snapshot_url}
+
+    # Snapshot text is cached by web_fetcher, so only new timestamps hit the network
+    text = get_page_text(point['snapshot_url'], rules)
+    if not text:
+        point.update(status='error', error='Failed to fetch content')
+        return point
+
+    clean_text = extract_meaningful_content(text)
+    point.update(status='ok', text=text, content_hash=get_hash(clean_text), line_count=clean_text.count('\n') + 1)
+    return point
+
+def build_timeline(url, timestamps, engine=None, include_current=False, rules=None):
+    """
+    Compares a page across several Wayback timestamps.
+
+    Every snapshot is fetched once (and served from the snapshot cache
+    afterwards) and only adjacent snapshots are diffed. Interval results are
+    cached by the content hashes of their two ends, so extending a timeline
+    by one timestamp costs one fetch and one diff. Each adjacent pair goes
+    through clean_pair, so intervals match /generate-diff for the same pair.
+
+    Args:
+        url (str): The live URL
+        timestamps (list): Validated YYYYMMDD timestamps
+        engine (str): Optional diff engine name
+        include_current (bool): Add the live page as the last point
+        rules (ExtractionRules): Optional boilerplate rules for text extraction
+
+    Returns:
+        dict: The points in chronological order, one interval per adjacent pair
+        of fetched points and a summary
+
+    Raises:
+        ComparisonError: If the diff pool is too busy
+    """
+    requested = sorted(set(timestamps))
+    if include_current:
+        requested.append(None)
+
+    # Fetch the points side by side on the timeline pool
+    futures = [metrics.submit(timeline_executor, fetch_point, url, timestamp, rules) for timestamp in requested]
+    wait(futures, timeout=FETCH_DEADLINE)
+    points = []
+    for timestamp, future in zip(requested, futures):
+        if future.done() and not future.exception():
+            points.append(future.result())
+        else:
+            future.cancel()
+            points.append({'timestamp': timestamp or 'current', 'status': 'error', 'error': 'Failed to fetch content'})
+
+    fetched = [point for point in points if point['status'] == 'ok']
+    intervals = []
+    pending = {}
+    engine_name = engine or DIFF_ENGINE
+    for earlier, later in zip(fetched, fetched[1:]):
+        clean_later, clean_earlier = clean_pair(url, later['text'], earlier['text'])
+        earlier_hash, later_hash = get_hash(clean_earlier), get_hash(clean_later)
+        key = f"{engine_name}|{earlier_hash}|{later_hash}"
+        interval = {'from': earlier['timestamp'], 'to': later['timestamp'], 'key': key}
+        intervals.append(interval)
+
+        cached = interval_results.get(key)
+        if cached is not None:
+            interval.update(cached, cached_result=True)
+        elif earlier_hash == later_hash:
+            # Nothing changed in between, so the trivial diff runs in-process
+            interval.update(diff_stats(clean_later, clean_earlier, url, earlier['capture_timestamp'], engine), cached_result=False)
+        elif key not in pending:
+            args = (clean_later, clean_earlier, url, earlier['capture_timestamp'], engine)
+            with diff_pool_capacity():
+                pending[key] = (args, diff_pool.submit(diff_stats, *args))
+
+    # A failed diff only affects its own interval
+    computed = {}
+    for key, (args, future) in pending.items():
+        try:
+            computed[key] = diff_pool.get_result(future, diff_stats, *args)
+        except Exception as e:
+            computed[key] = {'status': 'error', 'error': f'Diff failed: {e}'}
+            continue
+        interval_results.put(computed[key], key)
+    for interval in intervals:
+        key = interval.pop('key')
+        if key in computed:
+            interval.update(computed[key], cached_result=False)
+
+    for point in points:
+        point.pop('text', None)
+
+    return {
+        'url': url,
+        'points': points,
+        'intervals': intervals,
+        'summary': {
+            'snapshots': len(points),
+            'fetched': len(fetched),
+            'intervals': len(intervals),
+            'changed': sum(1 for interval in intervals if 'stats' in interval and not interval['stats']['is_identical']),
+            'computed': len(pending)
+        }
+    }
@@ -1,5 +1,6 @@
 import hashlib
-from datetime import datetime
+import heapq
+from datetime import datetime, timedelta
 
 def get_hash(text):
     """Computes SHA-256 hash of given text."""
@@ -10,18 +11,16 @@ def extract_meaningful_content(text):
     lines = [line.strip() for line in text.splitlines() if line.strip()]
     return "\n".join(lines)
 
-def extract_significant_changes(archived_lines, current_lines):
-    """Extract the most significant changes for a summary section."""
-    import difflib
-    differ = difflib.Differ()
-    diff = list(differ.compare(archived_lines, current_lines))
-    
-    added = [line[2:] for line in diff if line.startswith('+ ')]
-    removed = [line[2:] for line in diff if line.startswith('- ')]
+def extract_significant_changes(opcodes, archived_lines, current_lines):
+    """Extract the most significant changes for a summary section from line diff opcodes."""
+    added = (current_lines[j] for tag, i1, i2, j1, j2 in opcodes
+             if tag in ('insert', 'replace') for j in range(j1, j2))
+    removed = (archived_lines[i] for tag, i1, i2, j1, j2 in opcodes
+               if tag in ('delete', 'replace') for i in range(i1, i2))
     
     # Find the most significant changes (longer lines often contain more meaningful content)
-    significant_added = sorted(added, key=len, reverse=True)[:5] if added else []
-    significant_removed = sorted(removed, key=len, reverse=True)[:5] if removed else []
+    significant_added = heapq.nlargest(5, added, key=len)
+    significant_removed = heapq.nlargest(5, removed, key=len)
     
     return significant_added, significant_removed
 
@@ -34,4 +33,35 @@ def get_formatted_dates(timestamp):
 def create_filename(url, timestamp):
     """Create a filename based on the URL and timestamp."""
     domain = url.split("//")[-1].split("/")[0]
-    return f"diff_{domain}_{timestamp}_{datetime.now().strftime('%Y%m%d')}.html" 
\ No newline at end of file
+    return f"diff_{domain}_{timestamp}_{datetime.now().strftime('%Y%m%d')}.html"
+
+def validate_timestamp(timestamp):
+    """
+    Validates that the provided timestamp is not later than yesterday.
+    
+    Args:
+        timestamp (str): A timestamp in YYYYMMDD format
+        
+    Returns:
+        tuple: (valid_timestamp, warning_message)
+    """
+    try:
+        # Parse the timestamp
+        timestamp_date = datetime.strptime(timestamp, "%Y%m%d").date()
+        
+        # Get yesterday's date
+        today = datetime.now().date()
+        yesterday = today - timedelta(days=1)
+        
+        # If timestamp is today or later, use yesterday instead
+        if timestamp_date >= today:
+            warning_message = f"Warning: The selected date ({timestamp_date.strftime('%Y-%m-%d')}) is too recent for comparison. Using yesterday's date instead."
+            new_timestamp = yesterday.strftime("%Y%m%d")
+            return new_timestamp, warning_message
+        return timestamp, None
+    except ValueError:
+        # If timestamp format is invalid, use yesterday's date
+        yesterday = datetime.now().date() - timedelta(days=1)
+        new_timestamp = yesterday.strftime("%Y%m%d")
+        warning_message = "Invalid date format. Using yesterday's date instead."
+        return new_timestamp, warning_message
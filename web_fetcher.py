@@ -1,26 +1,371 @@
+import os
+import re
+import time
+import codecs
+import threading
+from concurrent.futures import Future
+from urllib.parse import urlsplit
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry, make_headers
+from text_extractor import create_extractor, DEFAULT_RULES
+from cache import snapshot_cache, cache_key, LIVE_TTL
+from metrics import stage, observe_stage, count
 
-def get_page_text(url):
-    """Fetches the URL and returns the text content of the page."""
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-    }
-    try:
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching {url}: {e}")
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Connection settings, overridable through the environment
+CONNECT_TIMEOUT = float(os.environ.get('FETCH_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('FETCH_READ_TIMEOUT', 10))
+POOL_HOSTS = int(os.environ.get('FETCH_POOL_HOSTS', 16))
+POOL_SIZE_PER_HOST = int(os.environ.get('FETCH_POOL_SIZE', 8))
+MAX_RETRIES = int(os.environ.get('FETCH_MAX_RETRIES', 2))
+RETRY_BACKOFF = float(os.environ.get('FETCH_RETRY_BACKOFF', 0.5))
+MAX_BYTES = int(os.environ.get('FETCH_MAX_BYTES', 5 * 1024 * 1024))
+CHUNK_SIZE = 64 * 1024
+
+# Wayback Machine availability API, used to find the capture closest to a timestamp
+WAYBACK_AVAILABILITY_URL = os.environ.get('WAYBACK_AVAILABILITY_URL', 'https://archive.org/wayback/available')
+SNAPSHOT_LOOKUP_TTL = float(os.environ.get('SNAPSHOT_LOOKUP_TTL', 86400))
+
+# Per-host request rates, e.g. "web.archive.org=5,example.com=2" (requests per second)
+HOST_RATE_LIMITS = {
+    host.strip(): float(rate)
+    for host, _, rate in (
+        item.partition('=') for item in os.environ.get('FETCH_HOST_RATE_LIMITS', 'web.archive.org=5,archive.org=5').split(',')
+    )
+    if host.strip() and rate
+}
+
+WAYBACK_URL_PATTERN = re.compile(r'^https?://web\.archive\.org/web/(\d+)[a-z_]*/(.+)$')
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+# Requests and handshakes of connection pools urllib3 has already dropped, so the totals never go down
+_retired_pool_stats = {'requests': 0, 'handshakes': 0}
+_pool_stats_lock = threading.Lock()
+
+_host_next_slot = {}
+_rate_lock = threading.Lock()
+
+# Fetches currently running, keyed like the cache, so concurrent callers can share them
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+_single_flight_stats = {'fetches': 0, 'deduplicated': 0}
+
+def get_session():
+    """Returns the shared pooled session for this process, creating it if needed."""
+    global _session, _session_pid
+    # Sessions must not be shared across forked workers, so key them by pid
+    if _session is not None and _session_pid == os.getpid():
+        return _session
+    with _session_lock:
+        if _session is None or _session_pid != os.getpid():
+            _session = create_session()
+            _session_pid = os.getpid()
+            # A forked worker starts counting from scratch
+            _retired_pool_stats.update(requests=0, handshakes=0)
+    return _session
+
+def create_session():
+    """Builds a keep-alive session with a bounded pool per host and retry/backoff."""
+    retry = Retry(
+        total=MAX_RETRIES,
+        backoff_factor=RETRY_BACKOFF,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(
+        pool_connections=POOL_HOSTS,
+        pool_maxsize=POOL_SIZE_PER_HOST,
+        max_retries=retry,
+        pool_block=False
+    )
+    track_retired_pools(adapter.poolmanager)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    # Advertise gzip/deflate, plus brotli when a decoder is installed
+    session.headers.update(make_headers(keep_alive=True, accept_encoding=True))
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+def track_retired_pools(pool_manager):
+    """Adds each host pool's counters to the running totals when urllib3 evicts it."""
+    pools = pool_manager.pools
+    dispose = pools.dispose_func
+
+    def retire(pool):
+        with _pool_stats_lock:
+            _retired_pool_stats['requests'] += pool.num_requests
+            _retired_pool_stats['handshakes'] += pool.num_connections
+        if dispose:
+            dispose(pool)
+
+    pools.dispose_func = retire
+
+def get_pool_stats():
+    """
+    Returns connection reuse counters for the shared session.
+
+    'hosts' is the number of host pools currently open; the other counters
+    are running totals for this process, including pools that were evicted
+    once more than POOL_HOSTS hosts were in use.
+    """
+    stats = {'hosts': 0, 'requests': 0, 'handshakes': 0, 'pool_hits': 0}
+    session = _session
+    if session is None or _session_pid != os.getpid():
+        return stats
+
+    with _pool_stats_lock:
+        stats['requests'] = _retired_pool_stats['requests']
+        stats['handshakes'] = _retired_pool_stats['handshakes']
+        # Both schemes share one adapter, so count each adapter once
+        adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats['hosts'] += 1
+                stats['requests'] += pool.num_requests
+                stats['handshakes'] += pool.num_connections
+    stats['pool_hits'] = stats['requests'] - stats['handshakes']
+    return stats
+
+def wait_for_host_slot(url):
+    """Blocks until the per-host rate limit allows another request to the URL's host."""
+    host = urlsplit(url).hostname
+    rate = HOST_RATE_LIMITS.get(host)
+    if not rate:
+        return
+    # Reserve the next free slot for this host, then sleep until it arrives
+    with _rate_lock:
+        now = time.monotonic()
+        slot = max(now, _host_next_slot.get(host, 0))
+        _host_next_slot[host] = slot + 1 / rate
+    if slot > now:
+        time.sleep(slot - now)
+
+def parse_wayback_url(url):
+    """Splits a Wayback Machine URL into (timestamp, original_url), or returns None."""
+    match = WAYBACK_URL_PATTERN.match(url)
+    if not match:
         return None
-    soup = BeautifulSoup(response.text, 'html.parser')
-    return soup.get_text()
+    return match.group(1), match.group(2)
+
+def get_page_text(url, rules=None):
+    """
+    Fetches the URL and returns the text content of the page.
+
+    Args:
+        url (str): The live or Wayback Machine URL
+        rules (ExtractionRules): Boilerplate rules; defaults to DEFAULT_RULES
+    """
+    rules = DEFAULT_RULES if rules is None else rules
+    # Archived snapshots never change, so they are cached without expiry
+    wayback = parse_wayback_url(url)
+    if wayback:
+        key = cache_key(wayback[1], wayback[0], rules.fingerprint)
+        ttl = None
+    else:
+        key = cache_key(url, profile=rules.fingerprint)
+        ttl = LIVE_TTL
+
+    cached = snapshot_cache.lookup(key)
+    if cached is not None and cached[2]:
+        count('cache_hits')
+        return cached[0]
+
+    count('cache_misses')
+    return single_flight(key, lambda: fetch_and_store(url, key, ttl, cached, rules))
+
+def fetch_and_store(url, key, ttl, cached, rules=None):
+    """Fetches (or revalidates) a page that missed the cache and stores the result."""
+    # A stale live entry lets us ask the origin whether anything changed
+    validators = cached[1] if cached is not None else None
+    text, new_validators, not_modified = fetch_page(url, validators, rules)
+    if not_modified:
+        snapshot_cache.refresh(key, ttl)
+        return cached[0]
+    if text is not None:
+        snapshot_cache.put(key, text, ttl=ttl, validators=new_validators)
+    return text
+
+def single_flight(key, fetch):
+    """
+    Runs fetch() once for all concurrent callers asking for the same key.
+    
+    The first caller performs the fetch; callers arriving while it is in
+    flight wait for it and receive the same result (or exception).
+    """
+    with _in_flight_lock:
+        future = _in_flight.get(key)
+        is_leader = future is None
+        if is_leader:
+            future = Future()
+            _in_flight[key] = future
+            _single_flight_stats['fetches'] += 1
+        else:
+            _single_flight_stats['deduplicated'] += 1
+
+    if not is_leader:
+        return future.result()
+
+    try:
+        result = fetch()
+        future.set_result(result)
+        return result
+    except BaseException as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _in_flight_lock:
+            del _in_flight[key]
+
+def get_single_flight_stats():
+    """Returns how many fetches ran and how many callers shared an in-flight fetch."""
+    with _in_flight_lock:
+        stats = dict(_single_flight_stats)
+        stats['in_flight'] = len(_in_flight)
+    return stats
+
+def fetch_page(url, validators=None, rules=None):
+    """
+    Downloads the URL, revalidating with If-None-Match/If-Modified-Since when possible.
+
+    Args:
+        url (str): The URL to fetch
+        validators (dict): Optional 'etag' and 'last_modified' values from a cached copy
+        rules (ExtractionRules): Boilerplate rules applied during extraction
+
+    Returns:
+        tuple: (text, validators, not_modified); text is None on errors and on 304 responses
+    """
+    headers = {}
+    if validators:
+        if validators.get('etag'):
+            headers['If-None-Match'] = validators['etag']
+        if validators.get('last_modified'):
+            headers['If-Modified-Since'] = validators['last_modified']
+
+    wait_for_host_slot(url)
+    # The fetch stage covers the whole download, including the extraction interleaved with it
+    with stage('fetch_wayback' if parse_wayback_url(url) else 'fetch_origin'):
+        try:
+            with get_session().get(url, headers=headers, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), stream=True) as response:
+                if response.status_code == 304 and headers:
+                    count('not_modified')
+                    return None, validators, True
+                response.raise_for_status()
+                new_validators = {
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                text = stream_page_text(response, url, rules=rules)
+        except requests.RequestException as e:
+            print(f"Error fetching {url}: {e}")
+            count('fetch_errors')
+            return None, None, False
+
+    return text, new_validators, False
+
+def stream_page_text(response, url, max_bytes=None, rules=None):
+    """
+    Extracts text from a streamed response without holding the whole body in memory.
+    
+    Args:
+        response (requests.Response): A response opened with stream=True
+        url (str): The URL being fetched, for log messages
+        max_bytes (int): Maximum number of decoded body bytes to read
+        rules (ExtractionRules): Boilerplate rules; defaults to DEFAULT_RULES
+        
+    Returns:
+        str: The text extracted from the (possibly truncated) body
+    """
+    if max_bytes is None:
+        max_bytes = MAX_BYTES
+
+    # Only trust the declared charset; requests otherwise assumes ISO-8859-1 for text/*
+    content_type = response.headers.get('Content-Type', '')
+    encoding = response.encoding if 'charset' in content_type.lower() else 'utf-8'
+    try:
+        decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    extractor = create_extractor(rules=rules)
+    received = 0
+    # Time spent parsing, as opposed to waiting for the network
+    extract_time = 0.0
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        start = time.perf_counter()
+        if received + len(chunk) > max_bytes:
+            chunk = chunk[:max_bytes - received]
+            received += len(chunk)
+            extractor.feed(decoder.decode(chunk))
+            extract_time += time.perf_counter() - start
+            print(f"Truncated {url} at {max_bytes} bytes")
+            break
+        received += len(chunk)
+        extractor.feed(decoder.decode(chunk))
+        extract_time += time.perf_counter() - start
+    start = time.perf_counter()
+    extractor.feed(decoder.decode(b'', final=True))
+    extractor.close()
+    text = extractor.get_text()
+    observe_stage('extract', extract_time + time.perf_counter() - start)
+    count('bytes_fetched', received)
+    return text
 
 def get_wayback_snapshot(url, timestamp):
-    """Creates a Wayback Machine URL for the given URL and timestamp."""
+    """
+    Creates a Wayback Machine URL for the capture closest to the given timestamp.
+    
+    The capture is resolved through the availability API so the URL points at
+    an exact snapshot, and the id_ modifier asks for the original page without
+    redirects or the injected Wayback toolbar. If the lookup fails, the
+    requested timestamp is used and the Wayback Machine redirects as before.
+    """
     # Format the URL properly for the Wayback Machine
     if url.endswith('/'):
         url = url[:-1]
-    
-    wayback_url = f"http://web.archive.org/web/{timestamp}/{url}"
+
+    capture_timestamp = resolve_wayback_timestamp(url, timestamp) or timestamp
+    wayback_url = f"https://web.archive.org/web/{capture_timestamp}id_/{url}"
     print(f"Creating Wayback URL: {wayback_url}")
-    return wayback_url 
\ No newline at end of file
+    return wayback_url
+
+def resolve_wayback_timestamp(url, timestamp):
+    """Returns the timestamp of the capture closest to timestamp, or None if there is none or the lookup failed."""
+    key = f"closest|{timestamp}|{url}"
+    # Cache hits and waits on another caller's lookup count towards the stage too
+    with stage('wayback_lookup'):
+        cached = snapshot_cache.get(key)
+        if cached is not None:
+            # An empty string records that the page has no captures
+            return cached or None
+        return single_flight(key, lambda: lookup_wayback_timestamp(url, timestamp, key))
+
+def lookup_wayback_timestamp(url, timestamp, key):
+    """Queries the availability API and caches the closest capture's timestamp under key."""
+    wait_for_host_slot(WAYBACK_AVAILABILITY_URL)
+    try:
+        response = get_session().get(
+            WAYBACK_AVAILABILITY_URL,
+            params={'url': url, 'timestamp': timestamp},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        response.raise_for_status()
+        closest = response.json().get('archived_snapshots', {}).get('closest') or {}
+    except (requests.RequestException, ValueError) as e:
+        print(f"Error looking up Wayback snapshot for {url}: {e}")
+        return None
+
+    capture_timestamp = closest.get('timestamp', '') if closest.get('available') else ''
+    snapshot_cache.put(key, capture_timestamp, ttl=SNAPSHOT_LOOKUP_TTL)
+    return capture_timestamp or None